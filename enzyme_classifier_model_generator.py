@@ -33,6 +33,9 @@ def run(file_path=None, input_data_config={}, input_model_config={}, input_evalu
     data_config['fraction'] = 1 
     #n-gram
     data_config['ngram'] = 1 
+    #n-grams appearing less than this in the training set share one OOV id, which shrinks max_features and
+    #the embedding table for ngram >= 3. the kept n-grams are saved in the model .pkl
+    #data_config['ngram_min_count'] = 5
     #traning percentage, validation percentage will be 1- training percentage
     data_config['train_percent'] = 0.7
     #how many tasks will be 
@@ -45,6 +48,18 @@ def run(file_path=None, input_data_config={}, input_model_config={}, input_evalu
     data_config['label_key'] = 'EC number'
     #if the examples of a class are below this value, that examples of the class will be removed
     data_config['class_example_threshhold'] = 1 
+    #label storage, 'dense' or 'sparse'. sparse keeps labels as index lists and densifies them per batch,
+    #which is needed for training on the full data set
+    data_config['label_storage'] = 'sparse'
+    #random seed of sampling and splitting, None for a different split on every run
+    #data_config['seed'] = 0
+    #every class of the target level is in the test set, the rest is split randomly, or by iterative
+    #stratification over the classes of all levels when stratify is True
+    #data_config['stratify'] = True
+    #rows of the same value of this column are kept in the same set
+    #data_config['split_group'] = 'Cluster name'
+    #file of per-class training and test example counts of the target level
+    #data_config['split_report'] = 'split_report.tab'
     #save data, if it is set, the data will be saved to files, the last one is the config file name, which save
     #object of python, and it will be saved with ending of .pkl
     #data_config['save_data'] = ['train50.tab', 'test50.tab', 'data_config50'] 
@@ -53,6 +68,16 @@ def run(file_path=None, input_data_config={}, input_model_config={}, input_evalu
     #the last name is the config file name without .pkl
     #data_config['reuse_data'] = ['train.tab', 'test.tab', 'data_config']
     data_config['reuse_data'] = ['train50.tab', 'test50.tab', 'data_config50'] 
+
+    #binary data cache: the encoded and padded data, label indices and config are saved as .npy files in a
+    #sub-folder keyed by the preprocessing settings, later runs with the same settings load them memory-mapped
+    #data_config['data_cache'] = './data_cache/'
+
+    #dataset directory: for data sets which do not fit in memory, the files of save_data are converted once by
+    #python -m framework.tools.sequence_dataset train.tab test.tab data_config ./dataset/ [ngram_min_count]
+    #the data manager below trains from the memory-mapped tokens and labels, padding and densifying per batch
+    #data_config['name'] = 'enzyme_dataset_data_manager'
+    #data_config['dataset_path'] = './dataset/'
     
     model_config = {}
     #embedding dimension
@@ -71,22 +96,40 @@ def run(file_path=None, input_data_config={}, input_model_config={}, input_evalu
     model_config['pool_size'] = 2 
     #the pool strides
     model_config['pooling_strides'] = 2 
+    #global pooling before the task heads instead of Flatten, it can be max, avg or attention. the model input shape
+    #becomes (None,), so the model size does not depend on max_len and length bucketing can be used
+    #model_config['global_pooling'] = 'max'
     #the model saving name without suffix 
     model_config['save_model_name'] = 'E_C_model'
     #model saving path
     model_config['save_path'] = './models/'
+    #also export the model to a TF SavedModel directory <save_model_name>_saved_model, which the prediction scripts load
+    #instead of the .h5 when it is not older. an existing model is exported by python -m framework.tools.export_saved_model <model_name>.
+    #it needs tf.keras 2 (e.g. TF_USE_LEGACY_KERAS=1 with tf_keras), keras 3 refuses the export and always loads the .h5
+    #model_config['export_saved_model'] = True
     #optimizer name
     model_config['optimizer'] = 'Adam' 
     #loss function
     model_config['loss_function'] = 'binary_crossentropy'
     #activation function
     model_config['last_activation'] = 'sigmoid'
-    #model manager name, currently support: basic_cnn_manager, dense_net_manager
+    #model manager name, currently support: basic_cnn_manager, dense_net_manager, dilated_res_net_manager
     model_config['name'] = 'basic_cnn_manager'
     #early_stopping, only for single task currently
     model_config['early_stopping'] = True
     #after how many epoch the learning will stop if there is no improvement. effective only early_stopping takes effect 
     model_config['patience'] = 15 
+    #input pipeline of training, 'numpy' feeds the arrays to Model.fit, 'tf_data' builds a tf.data pipeline
+    #which shuffles and batches row indices, gathers batches in parallel and prefetches them
+    model_config['input_pipeline'] = 'numpy'
+    #shuffle buffer of the 'tf_data' pipeline, by default the whole training set
+    #model_config['shuffle_buffer'] = 10000
+    #performance mode: XLA compilation, bfloat16 mixed precision when the cpu supports it (the output layers stay
+    #float32) and several training steps per execution. every part can be set by its own key
+    #model_config['performance_mode'] = True
+    #model_config['jit_compile'] = True
+    #model_config['mixed_precision'] = 'mixed_bfloat16'
+    #model_config['steps_per_execution'] = 32
 
     #the following configuration commented out is for dense_net_manager
     '''
@@ -104,6 +147,28 @@ def run(file_path=None, input_data_config={}, input_model_config={}, input_evalu
     model_config['initial_pool_width'] = 2
     model_config['initial_pool_stride'] = 1
     model_config['use_global_pooling'] = False
+    #when use_global_pooling is True, the model input shape is (None,), prediction can group sequences by length
+    #and pad every bucket only to its bound
+    model_config['length_bucketing'] = False
+    #memory-efficient dense blocks: the concatenation and bottleneck of every layer are recomputed in the backward
+    #pass instead of being kept, so deeper dense_types and bigger batches fit in memory at the cost of extra compute
+    model_config['memory_efficient'] = False
+    '''
+
+    #the following configuration commented out is for dilated_res_net_manager: dilated residual convolutions,
+    #every stage halves the length, and global pooling, so the model takes any input length
+    '''
+    model_config['name'] = 'dilated_res_net_manager'
+    model_config['initial_filters'] = 32
+    model_config['initial_conv_width'] = 7
+    model_config['conv_kernel_width'] = 3
+    model_config['stage_filters'] = [32, 64, 128, 128]
+    model_config['blocks_per_stage'] = 3
+    model_config['dilation_rates'] = [1, 2, 4]
+    model_config['downsample_stride'] = 2
+    model_config['global_pooling'] = 'max' #it can be max, avg or attention
+    model_config['drop_out_rate'] = 0.2
+    model_config['length_bucketing'] = True
     '''
 
 
@@ -124,8 +189,25 @@ def run(file_path=None, input_data_config={}, input_model_config={}, input_evalu
     evaluator_manager_config['train_model'] = True 
     #evaluator manager name: current support common_evaluator_manager
     evaluator_manager_config['name'] = 'common_evaluator_manager'
-    #customized batch
+    #customized batch: 'cluster' samples one example per cluster, 'bucket' groups sequences by length
+    #and pads every batch only to the bound of its bucket
     #evaluator_manager_config['batch_generator'] = 'cluster'
+    #bucket bounds for 'bucket' batch generator, by default they grow by 1.5 times from 64 to max_len
+    #evaluator_manager_config['bucket_bounds'] = [128, 256, 512]
+    #random seed of the 'cluster' batch generator, None for a different sampling on every run
+    #evaluator_manager_config['seed'] = 0
+    #number of threads which assemble batches of the batch generator ('bucket' gathers them by as many parallel
+    #calls of its tf.data pipeline), and the number of batches prepared ahead
+    #evaluator_manager_config['workers'] = 4
+    #evaluator_manager_config['prefetch'] = 10
+    #params, FLOPs per sequence, receptive field and latency of the model are appended to this file before training,
+    #a report of saved models is made by python -m framework.tools.model_report <report_file> <model_name> ...
+    #evaluator_manager_config['model_report'] = 'model_report.tab'
+    #per class ('class') or per task ('level') thresholds maximizing F-beta on the validation rows held out by fit (the last 1/6
+    #of the training set), they replace 0.5 in evaluation and prediction and are saved in the model .pkl. not with batch_generator
+    #evaluator_manager_config['threshold_tuning'] = 'class'
+    #beta of F-beta, below 1 favors precision
+    #evaluator_manager_config['threshold_beta'] = 1.0
     #custom batch generator debug file
     evaluator_manager_config['debug_file'] = 'debug_file.tab'
 
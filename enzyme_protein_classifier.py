@@ -1,38 +1,57 @@
 from framework import init 
 from framework.model_manager import model_manager_creator 
+from framework.tools import residue_report
+from framework.tools import threshold_tuning
 import numpy as np
 import sys, getopt
 import pandas as pd
+from datetime import datetime
 
-def run(input_file, output_file, model_name):
-    mc = model_manager_creator.instance.create_from_file(model_name)
-    y_pred, entry_name = mc.predict_on_file(input_file)
-    data_manager = mc.get_data_manager()
-    bool_labels = []
-    
+def get_result(data_manager, y_pred, entry_name):
     task_num = data_manager.get_task_num()
     if task_num == 1:
         y_pred = [y_pred]
     
-    for i in range(data_manager.get_task_num()):
-        bool_labels.append(y_pred[i] > 0.5)
+    bool_labels = threshold_tuning.apply_thresholds(y_pred, data_manager.get_thresholds())
     
     labels = data_manager.one_hot_to_labels(bool_labels)
-    labels = labels[0]
-    labels = np.array(labels)
-    df = pd.DataFrame(labels, columns=['is enzyme'])
+    df = pd.DataFrame({'is enzyme':labels[0]})
     entry_name = entry_name.to_frame()
     entry_name.reset_index(inplace=True, drop=True)
-    df = pd.concat([entry_name, df], axis=1)
-    df.to_csv(output_file, sep='\t', index=False)
+    return pd.concat([entry_name, df], axis=1)
+
+def run(input_file, output_file, model_name, chunk_size=None):
+    '''predict input_file and write the result to output_file. when chunk_size is given, the input file is
+    read, predicted and written chunk by chunk, so memory is bounded by chunk_size
+    '''
+    mc = model_manager_creator.instance.create_from_file(model_name)
+    data_manager = mc.get_data_manager()
+    report = residue_report.unknown_residue_report()
+    begin = datetime.now()
+    if chunk_size:
+        results = mc.predict_on_file_in_chunks(input_file, chunk_size, report)
+    else:
+        results = [mc.predict_on_file(input_file, report)]
+
+    need_head = True
+    seq_num = 0
+    for y_pred, entry_name in results:
+        df = get_result(data_manager, y_pred, entry_name)
+        df.to_csv(output_file, sep='\t', index=False, mode='w' if need_head else 'a', header=need_head)
+        need_head = False
+        seq_num += df.shape[0]
+    cost = (datetime.now() - begin).total_seconds()
+    print('predicted %d sequences in %f seconds, %f sequences/sec' % (seq_num, cost, seq_num / max(cost, 1e-6)))
+    report.save(residue_report.get_report_file(output_file))
 
 def command_line_parser(argv):
-    help_str = 'enzyme_protein_classifier.py -i <input_file> -o <output_file> -m <model_name>'
+    help_str = 'enzyme_protein_classifier.py -i <input_file> -o <output_file> -m <model_name> [-c <chunk_size>]'
     input_file = ''
     output_file = ''
     model_name = ''
+    chunk_size = None
     try:
-        opts, args = getopt.getopt(argv,"hi:o:m:",["ifile=","ofile=", "model="])
+        opts, args = getopt.getopt(argv,"hi:o:m:c:",["ifile=","ofile=", "model=", "chunksize="])
     except getopt.GetoptError:
         print(help_str) 
         sys.exit(2)
@@ -46,17 +65,19 @@ def command_line_parser(argv):
             output_file = arg
         elif opt in ('-m', '--model'):
             model_name = arg
+        elif opt in ('-c', '--chunksize'):
+            chunk_size = int(arg)
     if not output_file or not input_file or not model_name:
         print(help_str)
         sys.exit()
-    return input_file, output_file, model_name
+    return input_file, output_file, model_name, chunk_size
 
 def main(argv):
     input_file = ''
     output_file = ''
     model_name = ''
-    input_file, output_file, model_name = command_line_parser(argv)
-    run(input_file, output_file, model_name)
+    input_file, output_file, model_name, chunk_size = command_line_parser(argv)
+    run(input_file, output_file, model_name, chunk_size)
 
 if __name__ == "__main__":
    main(sys.argv[1:])
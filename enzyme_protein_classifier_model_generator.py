@@ -25,6 +25,9 @@ def run(file_path=None, input_data_config={}, input_model_config={}, input_evalu
     data_config['fraction'] = 1
     #ngram
     data_config['ngram'] = 1 
+    #n-grams appearing less than this in the training set share one OOV id, which shrinks max_features and
+    #the embedding table for ngram >= 3. the kept n-grams are saved in the model .pkl
+    #data_config['ngram_min_count'] = 5
     #training percentage
     data_config['train_percent'] = 0.7
     #currently only 1 is supported for enzyme protein classifier generator
@@ -49,22 +52,40 @@ def run(file_path=None, input_data_config={}, input_model_config={}, input_evalu
     model_config['pool_size'] = 16
     #pooling strides 
     model_config['pooling_strides'] = 16
+    #global pooling before the task heads instead of Flatten, it can be max, avg or attention. the model input shape
+    #becomes (None,), so the model size does not depend on max_len and length bucketing can be used
+    #model_config['global_pooling'] = 'max'
     #the generated model name without 
     model_config['save_model_name'] = 'E_P_model'
     #where the model will be generated
     model_config['save_path'] = './models/'
+    #also export the model to a TF SavedModel directory <save_model_name>_saved_model, which the prediction scripts load
+    #instead of the .h5 when it is not older. an existing model is exported by python -m framework.tools.export_saved_model <model_name>.
+    #it needs tf.keras 2 (e.g. TF_USE_LEGACY_KERAS=1 with tf_keras), keras 3 refuses the export and always loads the .h5
+    #model_config['export_saved_model'] = True
     #last activation
     model_config['last_activation'] = 'softmax'
     #losst function
     model_config['loss_function'] = 'categorical_crossentropy'
     #optimizer name
     model_config['optimizer'] = 'Adam'
-    #Main part manager name, support basic_cnn_manager, dense_net_manager
+    #Main part manager name, support basic_cnn_manager, dense_net_manager, dilated_res_net_manager
     model_config['name'] = 'basic_cnn_manager'
     #early_stopping, only for single task currently
     model_config['early_stopping'] = True
     #after how many epoch the learning will stop if there is no improvement. effective only early_stopping takes effect 
     model_config['patience'] = 40
+    #input pipeline of training, 'numpy' feeds the arrays to Model.fit, 'tf_data' builds a tf.data pipeline
+    #which shuffles and batches row indices, gathers batches in parallel and prefetches them
+    model_config['input_pipeline'] = 'numpy'
+    #shuffle buffer of the 'tf_data' pipeline, by default the whole training set
+    #model_config['shuffle_buffer'] = 10000
+    #performance mode: XLA compilation, bfloat16 mixed precision when the cpu supports it (the output layers stay
+    #float32) and several training steps per execution. every part can be set by its own key
+    #model_config['performance_mode'] = True
+    #model_config['jit_compile'] = True
+    #model_config['mixed_precision'] = 'mixed_bfloat16'
+    #model_config['steps_per_execution'] = 32
 
     #following commented out configuration is for  dense_net 
     '''
@@ -82,6 +103,28 @@ def run(file_path=None, input_data_config={}, input_model_config={}, input_evalu
     model_config['initial_pool_width'] = 2
     model_config['initial_pool_stride'] = 2 
     model_config['use_global_pooling'] = False
+    #when use_global_pooling is True, the model input shape is (None,), prediction can group sequences by length
+    #and pad every bucket only to its bound
+    model_config['length_bucketing'] = False
+    #memory-efficient dense blocks: the concatenation and bottleneck of every layer are recomputed in the backward
+    #pass instead of being kept, so deeper dense_types and bigger batches fit in memory at the cost of extra compute
+    model_config['memory_efficient'] = False
+    '''
+
+    #the following configuration commented out is for dilated_res_net_manager: dilated residual convolutions,
+    #every stage halves the length, and global pooling, so the model takes any input length
+    '''
+    model_config['name'] = 'dilated_res_net_manager'
+    model_config['initial_filters'] = 32
+    model_config['initial_conv_width'] = 7
+    model_config['conv_kernel_width'] = 3
+    model_config['stage_filters'] = [32, 64, 128, 128]
+    model_config['blocks_per_stage'] = 3
+    model_config['dilation_rates'] = [1, 2, 4]
+    model_config['downsample_stride'] = 2
+    model_config['global_pooling'] = 'max' #it can be max, avg or attention
+    model_config['drop_out_rate'] = 0.2
+    model_config['length_bucketing'] = True
     '''
 
     evaluator_manager_config = {}
@@ -99,6 +142,14 @@ def run(file_path=None, input_data_config={}, input_model_config={}, input_evalu
     evaluator_manager_config['round_size'] = 1
     #evaluator manager name: currently only common_evaluator_manager
     evaluator_manager_config['name'] = 'common_evaluator_manager'
+    #params, FLOPs per sequence, receptive field and latency of the model are appended to this file before training,
+    #a report of saved models is made by python -m framework.tools.model_report <report_file> <model_name> ...
+    #evaluator_manager_config['model_report'] = 'model_report.tab'
+    #per class ('class') or per task ('level') thresholds maximizing F-beta on the validation rows held out by fit (the last 1/6
+    #of the training set), they replace 0.5 in evaluation and prediction and are saved in the model .pkl. not with batch_generator
+    #evaluator_manager_config['threshold_tuning'] = 'class'
+    #beta of F-beta, below 1 favors precision
+    #evaluator_manager_config['threshold_beta'] = 1.0
     #need to train model or just print some information 
     evaluator_manager_config['train_model'] = True
 
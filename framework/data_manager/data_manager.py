@@ -0,0 +1,55 @@
+from framework import utili
+from framework.bio import BioDefine
+from framework.tools import ngram_vocabulary
+
+class data_common_manager:
+    '''n-gram encoding of the Sequence column and tuned thresholds shared by the data managers, which keep
+    their settings in self.config and the vocabulary in self.vocabulary
+    '''
+    def get_vocabulary(self):
+        if self.vocabulary is None:
+            self.vocabulary = ngram_vocabulary.ngram_vocabulary.from_config(BioDefine.aaList, self.config)
+        return self.vocabulary
+
+    def learn_vocabulary(self, training_set):
+        '''when ngram_min_count is set, n-grams appearing less than it in the training set are mapped to an OOV id,
+        the kept n-grams are saved in the config, so they are in the model .pkl
+        '''
+        self.vocabulary = ngram_vocabulary.ngram_vocabulary(BioDefine.aaList, self.config['ngram'])
+        ngram_min_count = utili.get_table_value(self.config, 'ngram_min_count')
+        if ngram_min_count:
+            self.vocabulary = self.vocabulary.prune(training_set['Sequence'], ngram_min_count)
+            self.config['ngram_vocabulary'] = self.vocabulary.kept_codes
+        else:
+            self.config['ngram_vocabulary'] = None
+        self.config['ngram_oov'] = True
+        self.config['max_features'] = self.vocabulary.get_max_features()
+        print('max_features:', self.config['max_features'])
+
+    def encode_sequence(self, seqs, padding='post'):
+        '''encode a column of sequences into a padded (len(seqs), max_len) matrix
+        '''
+        codes, offsets = self.get_vocabulary().encode(seqs)
+        return utili.pad_batch_encoding(codes, offsets, self.config['max_len'], padding)
+
+    def get_x_rows(self, df):
+        '''rows of df which get_x predicts, sequences not shorter than max_len are dropped
+        '''
+        max_len = self.config['max_len']
+        return df[df['Sequence'].apply(lambda x:len(x)<max_len)]
+
+    def get_x_from_encoding(self, codes, offsets):
+        '''get data used for prediction from the result of utili.GetBatchOridinalEncoding
+        '''
+        return utili.pad_batch_encoding(self.get_vocabulary().map_codes(codes), offsets, self.config['max_len'], 'post')
+
+    def set_thresholds(self, thresholds):
+        '''thresholds of every task tuned on held-out predictions, they are saved with the model
+        '''
+        self.config['thresholds'] = {i:e for i, e in enumerate(thresholds)}
+
+    def get_thresholds(self):
+        '''thresholds of every task, a number or a per class vector, 0.5 when they are not tuned
+        '''
+        thresholds = utili.get_table_value(self.config, 'thresholds', {})
+        return [utili.get_table_value(thresholds, i, 0.5) for i in range(self.get_task_num())]
@@ -1,13 +1,16 @@
+import os
+import hashlib
 import numpy as np
 import pandas as pd
 from framework import utili
 from framework.strategy import hierarchical_learning
-from framework.bio import BioDefine
-from tensorflow.keras.preprocessing import sequence
 from framework.data_manager import data_manager_creator
+from framework.data_manager import data_manager
 from framework.tools import data_spliter
+from framework.tools import sparse_label
+from framework.tools import ec_label
 
-class enzyme_data_manager:
+class enzyme_data_manager(data_manager.data_common_manager):
     name = 'enzyme_data_manager'
     def __init__(self, config):
         self.config = config
@@ -34,98 +37,95 @@ class enzyme_data_manager:
                 }
         self.training_set = None
         self.test_set = None
+        self.vocabulary = None
 
-    def count_class_example(self, df, map_table, level):
-        def apply_fun(label_list):
-            for label in label_list: 
-                label = hierarchical_learning.get_label_to_level(label, level, '-')
-                if label in map_table:
-                    map_table[label] += 1
-                else:
-                    map_table[label] = 1
-
-        df[self.label_key].apply(lambda e:apply_fun(e))
-
-    def ___apply_threshold(self, df, level, threshold):
-        map_table = {}
-            
-        def delete_class_accord_threshold(label_list, threshold, map_tabel):
-            res = []
-            for label in label_list:
-                temp = hierarchical_learning.get_label_to_level(label, level, '-')
-                if map_table[temp] >  threshold:
-                    res.append(label)
-            return res
-
-        self.count_class_example(df, map_table, level)
-
-        return df[self.label_key].apply(lambda e:delete_class_accord_threshold(e, threshold, map_table))
+    def map_label_set_to_one_hot(self, label_set, num_classes):
+        return sparse_label.sparse_label_set.from_label_lists(label_set, num_classes).to_dense()
 
+    def get_x_from_df(self, df):
+        return self.encode_sequence(df['Sequence'])
 
-    def _apply_threshold(self, df):
-        '''This function is used to eliminate classes with examples less than threshold
+    def get_label_index_from_df(self, df):
+        '''get label indices of all levels as sparse_label_set
         '''
-        class_example_threshhold = self.config['class_example_threshhold']
-        size = df.shape[0]
-        level_num = self.config['level_num']
-        while True:
-            for i in range(level_num-1, -1, -1):
-                df[self.label_key] = self.___apply_threshold(df, i+1, class_example_threshhold)
-            df = df[df[self.label_key].apply(lambda e:len(e)>0)]
-
-            if size == df.shape[0]: 
-                break
-            else:
-                size = df.shape[0]
-        return df
+        y = []
+        for i in range(self.config['level_num']):
+            y.append(sparse_label.sparse_label_set.from_label_lists(df['level%d' % i], self.config['max_category'][i]))
+        return y
 
-    def map_true_value_to_number(true_values, map_table):
-        ret = None
-        if type(true_values) == list:
-            ret = []
-            for t in true_values:
-                ret.append(map_table[t])
-        else:
-            ret = map_table[true_values]
-        return ret
+    def apply_label_storage(self, y):
+        '''when label_storage is sparse, the targets are kept as sparse_label_set and densified per batch,
+        otherwise they are densified here
+        '''
+        label_storage = utili.get_table_value(self.config, 'label_storage', 'dense')
+        if label_storage == 'sparse':
+            return y
+        return [e.to_dense() for e in y]
 
-    def create_number_to_catogry_mapping(m):
-        ret = {}
-        for v, k in enumerate(m):
-            ret[k] = v
-        return ret
+    def get_y_from_df(self, df): 
+        return self.apply_label_storage(self.get_label_index_from_df(df))
 
-    def create_label_from_field(df, class_maps, field_name, label_name, index): 
-        values = list(class_maps[index].keys())
-        field_map_to_number = enzyme_data_manager.create_number_to_catogry_mapping(values)
-        df[label_name] = df[field_name].apply(lambda x:enzyme_data_manager.map_true_value_to_number(x, field_map_to_number))
-        return df,len(field_map_to_number), field_map_to_number
+    def get_input_files(self):
+        '''files the data is read from, the reuse_data files when they are given, otherwise file_path
+        '''
+        if 'reuse_data' in self.config:
+            reuse_data = self.config['reuse_data']
+            return [reuse_data[0], reuse_data[1], reuse_data[2] + '.pkl']
+        return [self.config['file_path']]
 
-    def get_level_labels(self, df, level, class_maps):
-        df["level%d" % level] = df[self.label_key].apply(lambda x:hierarchical_learning.get_label_to_level(x, level, 'unknown', class_maps))
-        return df
+    def get_cache_path(self):
+        '''get the folder of the binary data cache, it is keyed by a hash of the settings which affect preprocessing
+        and of the modification times of the input files, so changed inputs are preprocessed again
+        '''
+        data_cache = utili.get_table_value(self.config, 'data_cache')
+        if not data_cache:
+            return None
+        keys = ['file_path', 'reuse_data', 'ngram', 'max_len', 'class_example_threshhold', 'drop_multilabel', 'apply_dummy_label',
+                'fraction', 'train_percent', 'level_num', 'target_level', 'label_key', 'seed', 'stratify', 'split_group', 'ngram_min_count']
+        key_str = '_'.join(['%s:%s' % (k, utili.get_table_value(self.config, k)) for k in keys])
+        for input_file in self.get_input_files():
+            mtime = os.path.getmtime(input_file) if os.path.exists(input_file) else None
+            key_str += '_%s:%s' % (input_file, mtime)
+        return os.path.join(data_cache, hashlib.md5(key_str.encode('utf-8')).hexdigest())
+
+    def save_data_cache(self, cache_path, x_train, y_train, x_test, y_test):
+        '''save encoded x matrices, label index arrays and config as .npy files, the config is saved last
+        so a cache folder without it is incomplete
+        '''
+        print('save data cache:', cache_path)
+        if not os.path.exists(cache_path):
+            os.makedirs(cache_path)
+        for name, x, y in (('train', x_train, y_train), ('test', x_test, y_test)):
+            np.save(os.path.join(cache_path, 'x_%s.npy' % name), x)
+            for i, labels in enumerate(y):
+                np.save(os.path.join(cache_path, 'y_%s_level%d_indptr.npy' % (name, i)), labels.indptr)
+                np.save(os.path.join(cache_path, 'y_%s_level%d_indices.npy' % (name, i)), labels.indices)
+        drop_columns = ['Sequence'] + ['level%d' % i for i in range(self.config['level_num'] + 1)]
+        for name, df in (('training_set', self.training_set), ('test_set', self.test_set)):
+            df.drop(columns=[c for c in drop_columns if c in df.columns]).to_pickle(os.path.join(cache_path, '%s.pkl' % name))
+        utili.save_obj(self.config, os.path.join(cache_path, 'config'))
+
+    def load_data_cache(self, cache_path):
+        '''load the data saved by save_data_cache, the arrays are memory-mapped
+        '''
+        print('load data cache:', cache_path)
+        config = utili.load_obj(os.path.join(cache_path, 'config'))
+        for k in ['class_maps', 'field_map_to_number', 'number_to_field', 'max_category', 'using_set_num', 'max_len', 'level_num', 'max_features', 'ngram_vocabulary', 'ngram_oov']:
+            self.config[k] = utili.get_table_value(config, k)
 
-    def map_label_set_to_one_hot(self, label_set, num_classes):
-        ret = None
-        ret = np.zeros((len(label_set), num_classes)) 
-        for index, ec in enumerate(label_set):
-            for e in ec:
-                ret[index][e] = 1
+        ret = []
+        for name in ('train', 'test'):
+            x = np.load(os.path.join(cache_path, 'x_%s.npy' % name), mmap_mode='r')
+            y = []
+            for i in range(self.config['level_num']):
+                indptr = np.load(os.path.join(cache_path, 'y_%s_level%d_indptr.npy' % (name, i)), mmap_mode='r')
+                indices = np.load(os.path.join(cache_path, 'y_%s_level%d_indices.npy' % (name, i)), mmap_mode='r')
+                y.append(sparse_label.sparse_label_set(indptr, indices, self.config['max_category'][i]))
+            ret += [x, y]
+        self.training_set = pd.read_pickle(os.path.join(cache_path, 'training_set.pkl'))
+        self.test_set = pd.read_pickle(os.path.join(cache_path, 'test_set.pkl'))
         return ret
 
-    def get_x_from_df(self, df):
-        x = df['Encode']
-        x = sequence.pad_sequences(x, maxlen=self.config['max_len'], padding='post')
-        return x
-
-    def get_y_from_df(self, df): 
-        y = []
-        for i in range(self.config['level_num']):
-            temp = self.map_label_set_to_one_hot(df['level%d' % i], self.config['max_category'][i])
-            y.append(temp)
-        return y
-
-
     def reuse_data_process(self):
         reuse_data = self.config['reuse_data']
         training_set = pd.read_csv(reuse_data[0], sep='\t')
@@ -165,34 +165,44 @@ class enzyme_data_manager:
         level = self.config['level_num']
         
         if self.config['drop_multilabel'] > 0:
-            df = df[df[self.label_key].apply(lambda x: hierarchical_learning.multilabel_labels_not_greater(x, self.config['drop_multilabel']))]
+            df = df[df[self.label_key].str.count(';') < self.config['drop_multilabel']]
 
+        #EC numbers are parsed once, level truncation, class counting and threshold pruning work on the parsed table
+        labels = ec_label.ec_label_table.from_column(df[self.label_key], level)
         if not self.config['apply_dummy_label']:
-            df[self.label_key]= df[self.label_key].apply(lambda x:hierarchical_learning.get_label_list_according_to_level(x, level))
-            df = df[df[self.label_key].apply(lambda x:len(x)>0)]
-        else:
-            df[self.label_key]= df[self.label_key].apply(lambda x:hierarchical_learning.get_label_list(x))
-            
-        df['EC count'] = df[self.label_key].apply(lambda x:len(x))
+            labels = labels.take(labels.has_level(level))
+            has_label = labels.get_label_counts() > 0
+            df = df[has_label]
+            labels = labels.take_rows(has_label)
+
+        df['EC count'] = labels.get_label_counts()
 
         if self.config['max_len'] > 0:
-            df = df[df['Sequence'].apply(lambda x:len(x)<=self.config['max_len'])]
+            in_max_len = (df['Sequence'].str.len() <= self.config['max_len']).values
+            df = df[in_max_len]
+            labels = labels.take_rows(in_max_len)
             utili.print_debug_info(df, 'after drop seq more than %d ' % self.config['max_len'], print_head = True)
 
-        df = self._apply_threshold(df)
+        labels = labels.take(labels.apply_threshold(level, self.config['class_example_threshhold']))
+        has_label = labels.get_label_counts() > 0
+        df = df[has_label]
+        labels = labels.take_rows(has_label)
+        df[self.label_key] = pd.Series(labels.get_label_lists(), index=df.index)
 
         utili.print_debug_info(df, 'after apply threshold', print_head = True)
         
+        self.config['max_category'] = []
+        level_index = []
         for i in range(level):
-            df = self.get_level_labels(df, i+1, self.config['class_maps'])
+            names, class_index = labels.get_level_labels(i+1, 'unknown', self.config['class_maps'][i])
+            df['level%d' % (i+1)] = pd.Series(names, index=df.index)
+            level_index.append(class_index)
+            self.config['max_category'].append(len(self.config['class_maps'][i]))
+            self.config['field_map_to_number'][i] = utili.create_number_to_catogry_mapping(self.config['class_maps'][i].keys())
             utili.print_debug_info(df, 'after select to level %d' % i, print_head = True)
-        
-        self.config['max_category'] = []
+
         for i in range(level):
-            df, temp_max_category, temp_field_map_to_number = enzyme_data_manager.create_label_from_field(df, self.config['class_maps'],'level%d' % (i+1), 'level%d' % i, i)
-            self.config['max_category'].append(temp_max_category)
-            self.config['field_map_to_number'][i] = temp_field_map_to_number
-            utili.print_debug_info(df, 'after create task label to level %d' % i, print_head = True)
+            df['level%d' % i] = pd.Series(level_index[i], index=df.index)
         print('max_category:', self.config['max_category'])
         
         if self.config['print_statistics']:
@@ -215,7 +225,8 @@ class enzyme_data_manager:
                 print('*level %d: %d classes less than 10, occupy %f%% of %d' % (index+1, less_than_10, float(less_than_10) * 100.0 / self.config['max_category'][index], self.config['max_category'][index]))
         
         
-        df = df.sample(frac=self.config['fraction'])
+        seed = utili.get_table_value(self.config, 'seed')
+        df = df.sample(frac=self.config['fraction'], random_state=seed)
         utili.print_debug_info(df, 'after sampling frac=%f' % self.config['fraction'])
         self.config['using_set_num'] = df.shape[0]
         #df = df.reindex(np.random.permutation(df.index))
@@ -234,7 +245,18 @@ class enzyme_data_manager:
 
         training_amount = int(self.config['using_set_num'] * self.config['train_percent'])
         index_name = 'level%d' % (target_level - 1)
-        training_set, test_set = data_spliter.at_least_one_label_in_test_set(df, self.config['train_percent'], index_name, self.config['max_category'][self.config['target_level']-1])
+        label_names = None
+        if utili.get_table_value(self.config, 'stratify', False):
+            label_names = ['level%d' % i for i in range(level)]
+        split_group = utili.get_table_value(self.config, 'split_group')
+        training_set, test_set = data_spliter.split_data(df, self.config['train_percent'], index_name, label_names, split_group, seed)
+
+        class_counts = data_spliter.get_class_counts(training_set, test_set, index_name, self.config['max_category'][target_level-1])
+        print('training set: %d, test set: %d, classes without training example: %d' % (training_set.shape[0], test_set.shape[0], (class_counts['train'] == 0).sum()))
+        split_report = utili.get_table_value(self.config, 'split_report')
+        if split_report:
+            class_counts.insert(0, 'name', list(self.config['class_maps'][target_level-1].keys()))
+            class_counts.to_csv(split_report, sep='\t')
 
         df['Sequence'].apply(lambda x:set_max_len(x))
         print('max_len:', self.config['max_len'])
@@ -250,32 +272,41 @@ class enzyme_data_manager:
     def get_data(self, sep='\t'):
         '''This function is used to get training data, validation data from a csv file
         '''
-        training_set = None
-        test_set = None
-
-        if 'reuse_data' in self.config:
-            print('reuse_data')
-            training_set, test_set = self.reuse_data_process()
+        cache_path = self.get_cache_path()
+        if cache_path and os.path.exists(os.path.join(cache_path, 'config.pkl')):
+            x_train, y_train, x_test, y_test = self.load_data_cache(cache_path)
         else:
-            print('none reuse_data')
-            training_set, test_set = self.normal_process(sep)
+            training_set = None
+            test_set = None
 
+            if 'reuse_data' in self.config:
+                print('reuse_data')
+                training_set, test_set = self.reuse_data_process()
+            else:
+                print('none reuse_data')
+                training_set, test_set = self.normal_process(sep)
 
-        feature_list = utili.GetNGrams(BioDefine.aaList, self.config['ngram'])
-        self.config['max_features'] = len(feature_list) + 1
-        training_set['Encode'] = training_set['Sequence'].apply(lambda x:utili.GetOridinalEncoding(x, feature_list, self.config['ngram']))
-        test_set['Encode'] = test_set['Sequence'].apply(lambda x:utili.GetOridinalEncoding(x, feature_list, self.config['ngram']))
 
-        utili.print_debug_info(training_set, "training set", print_head=True)
-        utili.print_debug_info(test_set, "test set", print_head=True)
+            self.learn_vocabulary(training_set)
 
-        self.training_set = training_set
-        self.test_set = test_set
-        
-        x_train = self.get_x_from_df(training_set)
-        y_train = self.get_y_from_df(training_set)
-        x_test = self.get_x_from_df(test_set)
-        y_test = self.get_y_from_df(test_set)
+            utili.print_debug_info(training_set, "training set", print_head=True)
+            utili.print_debug_info(test_set, "test set", print_head=True)
+
+            self.training_set = training_set
+            self.test_set = test_set
+            
+            x_train = self.get_x_from_df(training_set)
+            y_train = self.get_label_index_from_df(training_set)
+            x_test = self.get_x_from_df(test_set)
+            y_test = self.get_label_index_from_df(test_set)
+
+            if cache_path:
+                self.save_data_cache(cache_path, x_train, y_train, x_test, y_test)
+
+        self.set_class_names()
+        self.set_class_tree()
+        y_train = self.apply_label_storage(y_train)
+        y_test = self.apply_label_storage(y_test)
 
         task_num = self.get_task_num() 
         if task_num == 1:
@@ -315,40 +346,72 @@ class enzyme_data_manager:
     def get_max_len(self):
         return self.config['max_len']
 
-    def _one_hot_to_labels(self, labels, task_id, map_table):
-        category_num = self.config['max_category'][task_id]
-        res = []
-        for label in labels:
-            temp = []
-            for index, element in enumerate(label): 
-                if element:
-                    temp.append(map_table[index])
-            res.append(temp)
-        return res
+    def _get_task_levels(self):
+        if self.get_task_num() == 4:
+            return list(range(4))
+        return [self.config['level_num'] - 1]
 
     def one_hot_to_labels(self, y):
         '''this function is used to transfer one-hot-encoding to label values
         '''
-        task_num = self.get_task_num()
-        number_to_field = self.config['number_to_field']
         ret = []
-        if task_num == 4: 
-            for i in range(task_num):
-                if not i in number_to_field:
-                    number_to_field[i] = utili.switch_key_value(self.config['field_map_to_number'][i])
-                labels = self._one_hot_to_labels(y[i], i, number_to_field[i])
-                ret.append(labels)
-        else:
-            level_num = self.config['level_num']
-            i = level_num - 1
-            if not i in number_to_field:
-                number_to_field[i] = utili.switch_key_value(self.config['field_map_to_number'][i])
-            ret.append(self._one_hot_to_labels(y[0], i, number_to_field[i]))
+        for i, level_index in enumerate(self._get_task_levels()):
+            ret.append(sparse_label.decode_label_lists(y[i], self.get_class_name_array(level_index)))
+        return ret
+
+    def one_hot_to_label_strings(self, y, sep=';'):
+        '''like one_hot_to_labels, but the labels of a row are joined by sep, ready to be written
+        '''
+        ret = []
+        for i, level_index in enumerate(self._get_task_levels()):
+            ret.append(sparse_label.decode_label_strings(y[i], self.get_class_name_array(level_index), sep))
         return ret
 
     def get_encode_info(self):
         return self.config
 
+    def get_class_names(self, level_index):
+        '''class names of a level in the order of the class indices
+        '''
+        field_map_to_number = self.config['field_map_to_number'][level_index]
+        return sorted(field_map_to_number, key=field_map_to_number.get)
+
+    def set_class_names(self):
+        '''store the class names of every level as numpy arrays in the config, so they are saved with the model
+        and predictions are decoded by indexing
+        '''
+        self.config['class_names'] = {}
+        for i in range(self.config['level_num']):
+            self.config['class_names'][i] = np.array(self.get_class_names(i), dtype=object)
+
+    def get_class_name_array(self, level_index):
+        if not 'class_names' in self.config:
+            #models saved before the class names were stored
+            self.set_class_names()
+        return self.config['class_names'][level_index]
+
+    def set_class_tree(self):
+        '''store the index of the parent class of every class of the levels below the first one, the EC tree
+        used by hierarchy-consistent decoding, so it is saved with the model
+        '''
+        self.config['parent_index'] = {}
+        for i in range(1, self.config['level_num']):
+            self.config['parent_index'][i] = hierarchical_learning.get_parent_index(self.get_class_names(i), self.get_class_names(i-1), i, 'unknown')
+
+    def get_parent_index(self):
+        if not 'parent_index' in self.config:
+            #models saved before the class tree was stored
+            self.set_class_tree()
+        return [None] + [self.config['parent_index'][i] for i in range(1, self.config['level_num'])]
+
+    def hierarchical_decode(self, y_pred):
+        '''threshold predictions of all levels with hierarchical_learning.hierarchical_decode and the thresholds
+        of get_thresholds, which needs a task for every level
+        '''
+        if self.get_task_num() != self.config['level_num']:
+            raise Exception('hierarchical decoding needs a task for every level, task_num: %d, level_num: %d' % (self.get_task_num(), self.config['level_num']))
+        return hierarchical_learning.hierarchical_decode(y_pred, self.get_parent_index(), self.get_thresholds())
+
     def get_class_statistic(self, c):
         '''This function is used to get class statistics
         '''
@@ -365,11 +428,9 @@ class enzyme_data_manager:
         def check_len(seq):
             if len(seq) > max_len:
                 raise Exception('len %d beyone max_len:%s' % (len(seq), seq))
-        df = df[df['Sequence'].apply(lambda x:len(x)<max_len)]
+        df = self.get_x_rows(df)
         df['Sequence'].apply(check_len)
-        feature_list = utili.GetNGrams(BioDefine.aaList, self.config['ngram'])
-        x = df['Sequence'].apply(lambda x:utili.GetOridinalEncoding(x, feature_list, self.config['ngram']))
-        return sequence.pad_sequences(x, maxlen=max_len, padding='post'), df['Entry name']
+        return self.encode_sequence(df['Sequence']), df['Entry name']
 
     def load_x_from_file(self, file_name):
         '''This function is used to get data used for prediction from a file
@@ -0,0 +1,77 @@
+import numpy as np
+from framework import utili
+from framework.data_manager import data_manager_creator
+from framework.data_manager import enzyme_data_manager
+from framework.tools import sequence_dataset
+
+class enzyme_dataset_data_manager(enzyme_data_manager.enzyme_data_manager):
+    '''trains from a dataset directory written by framework.tools.sequence_dataset. tokens and labels stay
+    memory-mapped, x is padded and y is densified per batch, so no padded matrix or DataFrame of sequences is
+    kept in memory. prediction works like enzyme_data_manager, since the config holds the same encode info
+    '''
+    name = 'enzyme_dataset_data_manager'
+    def __init__(self, config):
+        if not 'label_key' in config:
+            config['label_key'] = 'EC number'
+        super().__init__(config)
+        self.config['name'] = self.name
+        self.info = {}
+
+    def apply_metadata(self, metadata):
+        level_num = metadata['level_num']
+        self.config['level_num'] = level_num
+        self.config['label_key'] = metadata['label_key']
+        self.label_key = metadata['label_key']
+        self.config['ngram'] = metadata['ngram']
+        self.config['ngram_vocabulary'] = metadata['ngram_vocabulary']
+        if self.config['ngram_vocabulary'] is not None:
+            self.config['ngram_vocabulary'] = np.asarray(self.config['ngram_vocabulary'], dtype=np.int64)
+        self.config['ngram_oov'] = metadata['ngram_oov']
+        self.config['max_features'] = metadata['max_features']
+        self.config['max_len'] = metadata['max_len']
+        self.config['max_category'] = metadata['max_category']
+        self.config['using_set_num'] = metadata['using_set_num']
+        for i in range(level_num):
+            self.config['class_maps'][i] = {k:v for k, v in metadata['class_maps'][i]}
+            self.config['field_map_to_number'][i] = utili.create_number_to_catogry_mapping(self.config['class_maps'][i].keys())
+        self.config['number_to_field'] = {}
+        self.vocabulary = None
+        self.set_class_names()
+        self.set_class_tree()
+
+    def get_data(self, sep='\t'):
+        '''load the dataset of config['dataset_path'], x_train and x_test are sequence_dataset.padded_sequence_array
+        and the labels are always kept as sparse_label_set
+        '''
+        dataset_path = self.config['dataset_path']
+        print('load dataset:', dataset_path)
+        metadata = sequence_dataset.load_metadata(dataset_path)
+        self.apply_metadata(metadata)
+        x_train, y_train = sequence_dataset.load_split(dataset_path, 'train', metadata)
+        x_test, y_test = sequence_dataset.load_split(dataset_path, 'test', metadata)
+        print('training set: %d, test set: %d, max_len: %d, max_features: %d' % (len(x_train), len(x_test), self.config['max_len'], self.config['max_features']))
+
+        if self.get_task_num() == 1:
+            target_level = self.config['target_level']
+            y_train = [y_train[target_level - 1]]
+            y_test = [y_test[target_level - 1]]
+
+        self.x_train = x_train
+        self.y_train = y_train
+        self.x_test = x_test
+        self.y_test = y_test
+        return x_train, y_train, x_test, y_test
+
+    def get_training_and_test_set(self):
+        '''the other columns of the splits (no sequences) are only loaded when they are needed,
+        e.g. by the cluster batch generator
+        '''
+        for split in sequence_dataset.splits:
+            if not split in self.info:
+                self.info[split] = sequence_dataset.load_info(self.config['dataset_path'], split)
+        return self.info['train'], self.info['test']
+
+def create(config):
+   return enzyme_dataset_data_manager(config)
+
+data_manager_creator.instance.register(enzyme_dataset_data_manager.name, create)
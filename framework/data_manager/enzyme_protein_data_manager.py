@@ -1,17 +1,17 @@
 import pandas as pd
 import numpy as np
 from framework import utili 
-from framework.bio import BioDefine
 import tensorflow as tf
-from tensorflow.keras.preprocessing import sequence
 from tensorflow.keras.utils import to_categorical
 from framework.data_manager import data_manager_creator
+from framework.data_manager import data_manager
 
-class enzyme_protein_data_manager:
+class enzyme_protein_data_manager(data_manager.data_common_manager):
     name = 'enzyme_protein_data_manager'
     def __init__(self, config):
         self.config = config
         self.config['max_category'] = 2
+        self.vocabulary = None
 
     def get_data(self, sep='\t'):
         df = pd.read_csv(self.config['file_path'],sep=sep)
@@ -38,11 +38,8 @@ class enzyme_protein_data_manager:
         
         max_len = self.config['max_len']
         print('max_len:', max_len)
-        feature_list = utili.GetNGrams(BioDefine.aaList, self.config['ngram'])
-        self.config['max_features'] = len(feature_list) + 1
-        df['Encode'] = df['Sequence'].apply(lambda x:utili.GetOridinalEncoding(x, feature_list, self.config['ngram']))
-
         training_set = df.iloc[:int(using_set_num * self.config['train_percent'])]
+        self.learn_vocabulary(training_set)
         print('training set enzyme cnt:',training_set[training_set.Lables>0].shape[0])
         print('training non-enzyme cnt:', training_set[training_set.Lables==0].shape[0])
         test_set = df.iloc[training_set.shape[0]:]
@@ -50,14 +47,12 @@ class enzyme_protein_data_manager:
         print("test len:", test_set.shape[0])
 
         
-        x_train = training_set['Encode']
-        x_train = sequence.pad_sequences(x_train, maxlen=max_len)
+        x_train = self.encode_sequence(training_set['Sequence'], padding='pre')
         
         y_train = training_set['Lables']
         y_train = to_categorical(y_train)
         
-        x_test = test_set['Encode']
-        x_test = sequence.pad_sequences(x_test, maxlen=max_len)
+        x_test = self.encode_sequence(test_set['Sequence'], padding='pre')
         
         y_test = test_set['Lables']
         y_test = to_categorical(y_test)
@@ -92,20 +87,13 @@ class enzyme_protein_data_manager:
         return self.config['max_len']
 
     def one_hot_to_labels(self, y):
-        ret = []
-        y = y[0]
-        for e in y:
-            temp = 'unexpected'
-            for i, c in enumerate(e):
-                if c:
-                    if i == 0:
-                        temp = 'N'
-                    else:
-                        temp = 'Y'
-                    break
-            ret.append(temp)
-        ret = [ret]
-        return ret
+        '''N when the first predicted column is 0, Y when it is another column and unexpected when no
+        column is predicted
+        '''
+        y = np.asarray(y[0], dtype=bool)
+        ret = np.where(y.argmax(axis=1) == 0, 'N', 'Y').astype(object)
+        ret[~y.any(axis=1)] = 'unexpected'
+        return [ret]
 
     def get_encode_info(self):
         return self.config
@@ -118,11 +106,9 @@ class enzyme_protein_data_manager:
         def check_len(seq):
             if len(seq) > max_len:
                 raise Exception('len %d beyone max_len:%s' % (len(seq), seq))
-        df = df[df['Sequence'].apply(lambda x:len(x)<max_len)]
+        df = self.get_x_rows(df)
         df['Sequence'].apply(check_len)
-        feature_list = utili.GetNGrams(BioDefine.aaList, self.config['ngram'])
-        x = df['Sequence'].apply(lambda x:utili.GetOridinalEncoding(x, feature_list, self.config['ngram']))
-        return sequence.pad_sequences(x, maxlen=max_len, padding='post'), df['Entry name']
+        return self.encode_sequence(df['Sequence']), df['Entry name']
 
     def load_x_from_file(self, file_name):
         df = pd.read_csv(file_name, sep='\t')
@@ -1,2 +1,3 @@
 from framework.data_manager import enzyme_data_manager
 from framework.data_manager import enzyme_protein_data_manager
+from framework.data_manager import enzyme_dataset_data_manager
@@ -1,5 +1,6 @@
-from sklearn.metrics import classification_report
 from framework import utili
+from framework.tools import multilabel_metrics
+from framework.tools import threshold_tuning
 from framework.strategy import hierarchical_learning
 from framework.evaluator import evaluator_creator
 
@@ -37,37 +38,21 @@ class evaluator:
         if task_num == 1:
             y_pred = [y_pred]
 
-        map_table = {} 
+        bool_labels = threshold_tuning.apply_thresholds(y_pred, self.data_manager.get_thresholds())
 
-        bool_labels = []
         for i in range(task_num):
-            bool_labels.append(y_pred[i] > 0.5)
-
-        pred_labels = self.data_manager.one_hot_to_labels(bool_labels)
-
-        for i in range(task_num):
-            pred = bool_labels[i] 
-            target = y_test[i]
-            report = classification_report(target, pred)
-
             if print_report:
+                counts = multilabel_metrics.label_counts(y_test[i], bool_labels[i])
                 print('report level %d' % i)
-                print(report)
-                res = utili.strict_compare_report(target, pred, length)
+                print(multilabel_metrics.classification_report(counts))
+                res = counts.get_strict_accuracy_count()
                 print('strict accuracy is %d of %d, %f%%' % (res, length, float(res) * 100.0 / length))
 
-            res = {
-                0:0, 
-                1:0,
-                2:0,
-            }
-
-        for i in range(length):
-            for j in range(task_num-1):
-                if hierarchical_learning.get_conflict(pred_labels[j+1][i], pred_labels[j][i], j+1):
-                    res[j] += 1
+        #a child class whose parent class is not predicted is a conflict, it is checked on the predicted cells
         for i in range(task_num-1):
-            print('comflict between level %d and level %d is %d, %f%% of %d.' % (i+1, i+2, res[i], float(res[i]) * 100.0 /float(length), length))
+            parent_index = hierarchical_learning.get_parent_index(self.data_manager.get_class_names(i+1), self.data_manager.get_class_names(i), i+1)
+            res = len(hierarchical_learning.get_conflict_rows(bool_labels[i+1], bool_labels[i], parent_index))
+            print('comflict between level %d and level %d is %d, %f%% of %d.' % (i+1, i+2, res, float(res) * 100.0 /float(length), length))
     
     
 def create(data_manager):
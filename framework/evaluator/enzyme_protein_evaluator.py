@@ -1,5 +1,5 @@
-from sklearn.metrics import classification_report
-from framework import utili
+from framework.tools import multilabel_metrics
+from framework.tools import threshold_tuning
 from framework.evaluator import evaluator_creator
 
 class evaluator:
@@ -12,21 +12,12 @@ class evaluator:
         if task_num == 1:
             y_pred = [y_pred]
 
-        map_table = {} 
+        bool_labels = threshold_tuning.apply_thresholds(y_pred, self.data_manager.get_thresholds())
 
-        bool_labels = []
         for i in range(task_num):
-            bool_labels.append(y_pred[i] > 0.5)
-
-        pred_labels = self.data_manager.one_hot_to_labels(bool_labels)
-
-        for i in range(task_num):
-            pred = bool_labels[i] 
-            target = y_test[i]
-            report = classification_report(target, pred)
-
             if print_report:
-                print(report)
+                counts = multilabel_metrics.label_counts(y_test[i], bool_labels[i])
+                print(multilabel_metrics.classification_report(counts))
     
     
     
@@ -3,7 +3,10 @@ import pandas as pd
 from framework import utili
 from datetime import datetime
 from framework.evaluator_manager import evaluator_manager_creator
-from framework.tools.sequence_sampling import SequenceGenerator
+from framework.tools.sequence_sampling import SequenceGenerator, BucketSequenceGenerator
+from framework.tools import model_report as model_report_tool
+from framework.tools import threshold_tuning
+from framework.tools import sparse_label
     
 class common_evaluator_manager:
     name = 'common_evaluator_manager'
@@ -32,9 +35,18 @@ class common_evaluator_manager:
         if self.config['print_summary']:
             print(self.model_manager.get_summary())
 
+        model_report = utili.get_table_value(self.config, 'model_report')
+        if model_report:
+            report = model_report_tool.get_model_report(self.model_manager)
+            report['model_name'] = utili.get_table_value(self.model_manager.config, 'save_model_name')
+            model_report_tool.save_report([report], model_report)
+
         if not self.config['train_model']:
             return
 
+        if utili.get_table_value(self.config, 'threshold_tuning') and 'batch_generator' in self.config:
+            raise Exception('threshold_tuning needs the validation rows held out by fit, batch_generator trains on all training rows')
+
         if batch_round:
             round_size = utili.get_table_value(self.config, 'round_size', 10)
             total_size = (epochs + round_size - 1) // round_size
@@ -61,12 +73,18 @@ class common_evaluator_manager:
 
         if 'batch_generator' in self.config:
             print('batch_generator:', self.config['batch_generator'])
+            workers = utili.get_table_value(self.config, 'workers', 1)
+            prefetch = utili.get_table_value(self.config, 'prefetch', 10)
             if not self.sg:
-                debug_file = None
-                if 'debug_file' in self.config:
-                    debug_file = self.config['debug_file']
-                self.sg = SequenceGenerator(self.data_manager, batch_size, debug_file)
-            self.model_manager.fit_generator(self.sg, epochs = epochs)
+                if self.config['batch_generator'] == 'bucket':
+                    bucket_bounds = utili.get_table_value(self.config, 'bucket_bounds')
+                    self.sg = BucketSequenceGenerator(x_train, y_train, batch_size, bucket_bounds, self.model_manager.is_length_agnostic())
+                else:
+                    debug_file = None
+                    if 'debug_file' in self.config:
+                        debug_file = self.config['debug_file']
+                    self.sg = SequenceGenerator(self.data_manager, batch_size, debug_file, utili.get_table_value(self.config, 'seed'), workers, prefetch)
+            self.model_manager.fit_generator(self.sg, epochs = epochs, workers = workers, max_queue_size = prefetch)
         else:
             print('batch_generator:', 'default')
             self.model_manager.fit(x_train, y_train, epochs, batch_size)
@@ -75,6 +93,18 @@ class common_evaluator_manager:
         if not cur_round is None:
             suffix += '_round_' + str(cur_round)
 
+        threshold_mode = utili.get_table_value(self.config, 'threshold_tuning')
+        if threshold_mode:
+            #thresholds are tuned on the validation rows fit held out of training, the test set stays unseen.
+            #it is done before the model is saved, so they are in its .pkl
+            validation_rows = np.arange(self.model_manager.get_validation_split_at(len(x_train)), len(x_train))
+            y_validation = [sparse_label.take_rows(e, validation_rows) for e in y_train]
+            y_validation_pred = self.model_manager.predict(x_train[validation_rows])
+            thresholds = threshold_tuning.get_thresholds(y_validation_pred, y_validation, threshold_mode, utili.get_table_value(self.config, 'threshold_beta', 1.0))
+            self.data_manager.set_thresholds(thresholds)
+            for i, e in enumerate(thresholds):
+                print('task %d thresholds: mean %f, min %f, max %f' % (i, np.mean(e), np.min(e), np.max(e)))
+
         self.model_manager.save_model(suffix)
             
         y_pred = self.model_manager.predict(x_test)
@@ -12,6 +12,7 @@ from tensorflow.keras.models import load_model
 from framework import utili
 from framework.model_manager import model_manager
 from framework.model_manager import model_manager_creator
+from framework.model_manager import global_pooling
 
 
 def create(data_manager, config):
@@ -26,6 +27,10 @@ class basic_cnn_manager(model_manager.model_common_manager):
         max_len = self.data_manager.get_max_len()
         max_features = self.data_manager.get_max_feature()
         embedding_dims = self.config['embedding_dims']
+        if utili.get_table_value(self.config, 'global_pooling'):
+            #with global pooling the model does not depend on the input length
+            inputLayer = Input(shape=(None,))
+            return inputLayer, Embedding(max_features, embedding_dims)(inputLayer)
         inputLayer = Input(shape=(max_len,))
         return inputLayer, Embedding(max_features,
                             embedding_dims,
@@ -49,7 +54,11 @@ class basic_cnn_manager(model_manager.model_common_manager):
                 if j % pool_interval == 0:
                     lastLayer = Dropout(drop_out_rate)(lastLayer)
                     lastLayer = MaxPooling1D(pool_size=pool_size, strides=pooling_strides, padding='same')(lastLayer)
-        lastLayer = Flatten()(lastLayer)
+        pooling = utili.get_table_value(self.config, 'global_pooling')
+        if pooling:
+            lastLayer = global_pooling.GlobalPooling(pooling)(lastLayer)
+        else:
+            lastLayer = Flatten()(lastLayer)
         lastLayer = Dropout(drop_out_rate)(lastLayer)
         return lastLayer
     
@@ -62,8 +71,7 @@ class basic_cnn_manager(model_manager.model_common_manager):
         test_target = None 
         for i in range(self.data_manager.get_task_num()):
             task_lastLayer = Dense(self.config['hidden_width'], activation='relu')(lastLayer)
-            task_lastLayer = Dense(self.config['hidden_width'], activation='relu')(lastLayer)
-            task_lastLayer = Dense(self.data_manager.get_max_category()[i], activation=last_activation, name="task_%d_1" % i)(task_lastLayer)
+            task_lastLayer = Dense(self.data_manager.get_max_category()[i], activation=last_activation, name="task_%d_1" % i, dtype='float32')(task_lastLayer)
             output.append(task_lastLayer)
         model = Model(inputs=input_layer, outputs=output)
         return model
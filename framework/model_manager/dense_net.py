@@ -2,16 +2,95 @@
 import tensorflow
 from tensorflow.keras.layers import BatchNormalization, Activation, Conv1D, Concatenate, AveragePooling1D
 from tensorflow.keras.layers import Conv1D, BatchNormalization, Activation, MaxPooling1D, GlobalAveragePooling1D
+from tensorflow.keras.layers import Layer
 import copy
 
 
-def H_l(k, bottleneck_size, kernel_width):
+class CheckpointedConcatConv(Layer):
+    """
+    Concatenation followed by BN-ReLU-Conv, as the first convolution of H_l. The forward pass is wrapped in
+    tf.recompute_grad, so the concatenated features and their normalized copy are not kept for the backward pass
+    but recomputed from the layer inputs (Pleiss et al., memory-efficient DenseNets). Only the inputs, which are
+    kept by the dense block anyway, and the output of the convolution stay in memory.
+    The batch normalization is applied with its variables inside the checkpoint, which returns the batch
+    statistics, and the moving statistics are updated outside of it, so they are updated once per step as in
+    the normal dense block and not again when the forward pass is recomputed.
+
+    :param filters: int representing the number of output filters
+    :param kernel_width: int representing the width of the convolutional kernel
+    """
+
+    def __init__(self, filters, kernel_width, **kwargs):
+        super().__init__(**kwargs)
+        self.filters = filters
+        self.kernel_width = kernel_width
+        self.batch_normalization = BatchNormalization()
+        self.conv = Conv1D(
+            filters,
+            kernel_width,
+            strides=1,
+            padding="same",
+            dilation_rate=1)
+
+    @staticmethod
+    def _to_shape_list(input_shape):
+        #some keras versions pass the shape of a single input instead of a list of one shape
+        if isinstance(input_shape, tensorflow.TensorShape) or not isinstance(input_shape[0], (list, tuple, tensorflow.TensorShape)):
+            return [input_shape]
+        return input_shape
+
+    def build(self, input_shape):
+        #the variables are created here, they can not be created inside tf.recompute_grad
+        input_shape = self._to_shape_list(input_shape)
+        channels = sum(int(shape[-1]) for shape in input_shape)
+        shape = tuple(input_shape[0][:-1]) + (channels,)
+        self.batch_normalization.build(shape)
+        self.conv.build(shape)
+        super().build(input_shape)
+
+    def call(self, inputs, training=None):
+        if not isinstance(inputs, (list, tuple)):
+            inputs = [inputs]
+        bn = self.batch_normalization
+        def f(*xs):
+            x = tensorflow.concat(list(xs), axis=-1)
+            y = tensorflow.cast(x, tensorflow.float32)
+            if training:
+                mean, variance = tensorflow.nn.moments(y, axes=list(range(len(y.shape) - 1)))
+            else:
+                mean, variance = tensorflow.convert_to_tensor(bn.moving_mean), tensorflow.convert_to_tensor(bn.moving_variance)
+            y = tensorflow.nn.batch_normalization(y, mean, variance, bn.beta, bn.gamma, bn.epsilon)
+            y = self.conv(tensorflow.nn.relu(tensorflow.cast(y, x.dtype)))
+            return y, mean, variance
+        y, mean, variance = tensorflow.recompute_grad(f)(*inputs)
+        if training:
+            #the moving statistics are updated here, so the recomputed forward pass does not update them again
+            bn.moving_mean.assign(bn.moving_mean * bn.momentum + tensorflow.stop_gradient(mean) * (1 - bn.momentum))
+            bn.moving_variance.assign(bn.moving_variance * bn.momentum + tensorflow.stop_gradient(variance) * (1 - bn.momentum))
+        return y
+
+    def compute_output_shape(self, input_shape):
+        input_shape = self._to_shape_list(input_shape)
+        return tuple(input_shape[0][:-1]) + (self.filters,)
+
+    def get_config(self):
+        config = super().get_config()
+        config.update({'filters':self.filters, 'kernel_width':self.kernel_width})
+        return config
+
+#saved models with the layer can be loaded by load_model without custom_objects
+tensorflow.keras.utils.get_custom_objects()['CheckpointedConcatConv'] = CheckpointedConcatConv
+
+
+def H_l(k, bottleneck_size, kernel_width, memory_efficient=False):
     """ 
     A single convolutional "layer" as defined by Huang et al. Defined as H_l in the original paper
     
     :param k: int representing the "growth rate" of the DenseNet
     :param bottleneck_size: int representing the size of the bottleneck, as a multiple of k. Set to 0 for no bottleneck.
     :param kernel_width: int representing the width of the main convolutional kernel
+    :param memory_efficient: bool, if True the function takes the list of features to concatenate, and the
+        concatenation and the first BN-ReLU-Conv are checkpointed by CheckpointedConcatConv
     :return a function wrapping the keras layers for H_l
     """
 
@@ -19,7 +98,11 @@ def H_l(k, bottleneck_size, kernel_width):
     num_bottleneck_output_filters = k * bottleneck_size
 
     def f(x):
-        if use_bottleneck:
+        if memory_efficient:
+            if not use_bottleneck:
+                return CheckpointedConcatConv(k, kernel_width)(x)
+            x = CheckpointedConcatConv(num_bottleneck_output_filters, 1)(x)
+        elif use_bottleneck:
             x = BatchNormalization()(x)
             x = Activation("relu")(x)
             x = Conv1D(
@@ -40,7 +123,7 @@ def H_l(k, bottleneck_size, kernel_width):
     return f
 
 
-def dense_block(k, num_layers, kernel_width, bottleneck_size):
+def dense_block(k, num_layers, kernel_width, bottleneck_size, memory_efficient=False):
     """
     A single dense block of the DenseNet
     
@@ -48,10 +131,16 @@ def dense_block(k, num_layers, kernel_width, bottleneck_size):
     :param num_layers: int represending the number of layers in the block
     :param kernel_width: int representing the width of the main convolutional kernel
     :param bottleneck_size: int representing the size of the bottleneck, as a multiple of k. Set to 0 for no bottleneck.
+    :param memory_efficient: bool, if True the features are only concatenated inside the checkpointed layers,
+        and once at the end of the block, instead of once per layer
     :return a function wrapping the entire dense block
     """
     def f(x):
         layers_to_concat = [x]
+        if memory_efficient:
+            for _ in range(num_layers):
+                layers_to_concat.append(H_l(k, bottleneck_size, kernel_width, True)(copy.copy(layers_to_concat)))
+            return Concatenate(axis=-1)(layers_to_concat)
         for _ in range(num_layers):
             x = H_l(k, bottleneck_size, kernel_width)(x)
             layers_to_concat.append(x)
@@ -88,6 +177,39 @@ def transition_block(pool_size=2, stride=2, theta=0.5):
         return x
     return f
 
+#the number of layers of every dense block of the dense types
+dense_type_block_sizes = {
+    'd121':[6, 12, 24, 16],
+    'd169':[6, 12, 32, 32],
+    'd201':[6, 12, 48, 32],
+    'd264':[6, 12, 64, 48],
+}
+
+def get_receptive_field(
+        block_sizes,
+        conv_kernel_width,
+        transition_pool_size,
+        transition_pool_stride,
+        initial_conv_width,
+        initial_stride,
+        initial_pool_width,
+        initial_pool_stride):
+    """
+    The number of input positions which one position of the last dense block sees
+
+    :return int representing the receptive field
+    """
+    receptive_field = initial_conv_width
+    jump = initial_stride
+    receptive_field += (initial_pool_width - 1) * jump
+    jump *= initial_pool_stride
+    for block_size in block_sizes[:-1]:
+        receptive_field += block_size * (conv_kernel_width - 1) * jump
+        receptive_field += (transition_pool_size - 1) * jump
+        jump *= transition_pool_stride
+    receptive_field += block_sizes[-1] * (conv_kernel_width - 1) * jump
+    return receptive_field
+
 def DenseNet(
         k,
         block_sizes,
@@ -101,7 +223,8 @@ def DenseNet(
         initial_filters,
         initial_pool_width,
         initial_pool_stride,
-        use_global_pooling):
+        use_global_pooling,
+        memory_efficient=False):
     def f(x):
         x = Conv1D(
             initial_filters,
@@ -121,7 +244,8 @@ def DenseNet(
                 k,
                 block_size,
                 conv_kernel_width,
-                bottleneck_size)(x)
+                bottleneck_size,
+                memory_efficient)(x)
 
             x = transition_block(
                 pool_size=transition_pool_size,
@@ -134,7 +258,8 @@ def DenseNet(
             k,
             final_block_size,
             conv_kernel_width,
-            bottleneck_size)(x)
+            bottleneck_size,
+            memory_efficient)(x)
         x = BatchNormalization()(x)
         x = Activation("relu")(x)
         if use_global_pooling:
@@ -156,8 +281,9 @@ def DenseNet121(
         initial_filters,
         initial_pool_width,
         initial_pool_stride,
-        use_global_pooling):
-    block_sizes = [6, 12, 24, 16]
+        use_global_pooling,
+        memory_efficient=False):
+    block_sizes = dense_type_block_sizes['d121']
     return DenseNet(
         k,
         block_sizes,
@@ -171,7 +297,8 @@ def DenseNet121(
         initial_filters,
         initial_pool_width,
         initial_pool_stride,
-        use_global_pooling)
+        use_global_pooling,
+        memory_efficient)
 
 
 def DenseNet169(
@@ -186,8 +313,9 @@ def DenseNet169(
         initial_filters,
         initial_pool_width,
         initial_pool_stride,
-        use_global_pooling):
-    block_sizes = [6, 12, 32, 32]
+        use_global_pooling,
+        memory_efficient=False):
+    block_sizes = dense_type_block_sizes['d169']
     return DenseNet(
         k,
         block_sizes,
@@ -201,7 +329,8 @@ def DenseNet169(
         initial_filters,
         initial_pool_width,
         initial_pool_stride,
-        use_global_pooling)
+        use_global_pooling,
+        memory_efficient)
 
 
 def DenseNet201(
@@ -216,8 +345,9 @@ def DenseNet201(
         initial_filters,
         initial_pool_width,
         initial_pool_stride,
-        use_global_pooling):
-    block_sizes = [6, 12, 48, 32]
+        use_global_pooling,
+        memory_efficient=False):
+    block_sizes = dense_type_block_sizes['d201']
     return DenseNet(
         k,
         block_sizes,
@@ -231,7 +361,8 @@ def DenseNet201(
         initial_filters,
         initial_pool_width,
         initial_pool_stride,
-        use_global_pooling)
+        use_global_pooling,
+        memory_efficient)
 
 
 def DenseNet264(
@@ -246,8 +377,9 @@ def DenseNet264(
         initial_filters, 
         initial_pool_width, 
         initial_pool_stride, 
-        use_global_pooling):
-    block_sizes = [6, 12, 64, 48]
+        use_global_pooling,
+        memory_efficient=False):
+    block_sizes = dense_type_block_sizes['d264']
     return DenseNet(
         k,
         block_sizes,
@@ -261,4 +393,5 @@ def DenseNet264(
         initial_filters,
         initial_pool_width,
         initial_pool_stride,
-        use_global_pooling)
+        use_global_pooling,
+        memory_efficient)
@@ -27,11 +27,26 @@ class dense_net_manager(model_manager.model_common_manager):
         max_len = self.data_manager.get_max_len()
         max_features = self.data_manager.get_max_feature()
         embedding_dims = self.config['embedding_dims']
+        if utili.get_table_value(self.config, 'use_global_pooling', False):
+            #with global pooling the model does not depend on the input length
+            inputLayer = Input(shape=(None,))
+            return inputLayer, Embedding(max_features, embedding_dims)(inputLayer)
         inputLayer = Input(shape=(max_len,))
         return inputLayer, Embedding(max_features,
                             embedding_dims,
                             input_length=max_len)(inputLayer)
 
+    def get_receptive_field(self):
+        return dense_net.get_receptive_field(
+                dense_net.dense_type_block_sizes[utili.get_table_value(self.config, 'dense_type', 'd121')],
+                utili.get_table_value(self.config, 'conv_kernel_width', 3),
+                utili.get_table_value(self.config, 'transition_pool_size', 2),
+                utili.get_table_value(self.config, 'transition_pool_stride', 1),
+                utili.get_table_value(self.config, 'initial_conv_width', 3),
+                utili.get_table_value(self.config, 'initial_stride', 1),
+                utili.get_table_value(self.config, 'initial_pool_width', 2),
+                utili.get_table_value(self.config, 'initial_pool_stride', 1))
+
     def _create_main_path(self, lastLayer):
         dense_type = utili.get_table_value(self.config, 'dense_type', 'd121')
         dense_k = utili.get_table_value(self.config, 'dense_k', 12)
@@ -46,15 +61,17 @@ class dense_net_manager(model_manager.model_common_manager):
         initial_pool_width = utili.get_table_value(self.config, 'initial_pool_width', 2)
         initial_pool_stride = utili.get_table_value(self.config, 'initial_pool_stride', 1)
         use_global_pooling = utili.get_table_value(self.config, 'use_global_pooling', False)
+        #checkpoint the concatenation and bottleneck of every layer, which trades recomputation for memory
+        memory_efficient = utili.get_table_value(self.config, 'memory_efficient', False)
         #it can be d121,d169,d201 or d264 
         if dense_type == 'd121':
-            lastLayer = dense_net.DenseNet121(dense_k, conv_kernel_width, bottleneck_size, transition_pool_size, transition_pool_stride, theta, initial_conv_width, initial_stride, initial_filters, initial_pool_width, initial_pool_stride, use_global_pooling)(lastLayer)
+            lastLayer = dense_net.DenseNet121(dense_k, conv_kernel_width, bottleneck_size, transition_pool_size, transition_pool_stride, theta, initial_conv_width, initial_stride, initial_filters, initial_pool_width, initial_pool_stride, use_global_pooling, memory_efficient)(lastLayer)
         elif dense_type == 'd169': 
-            lastLayer = dense_net.DenseNet169(dense_k, conv_kernel_width, bottleneck_size, transition_pool_size, transition_pool_stride, theta, initial_conv_width, initial_stride, initial_filters, initial_pool_width, initial_pool_stride, use_global_pooling)(lastLayer)
+            lastLayer = dense_net.DenseNet169(dense_k, conv_kernel_width, bottleneck_size, transition_pool_size, transition_pool_stride, theta, initial_conv_width, initial_stride, initial_filters, initial_pool_width, initial_pool_stride, use_global_pooling, memory_efficient)(lastLayer)
         elif dense_type == 'd201': 
-            lastLayer = dense_net.DenseNet201(dense_k, conv_kernel_width, bottleneck_size, transition_pool_size, transition_pool_stride, theta, initial_conv_width, initial_stride, initial_filters, initial_pool_width, initial_pool_stride, use_global_pooling)(lastLayer)
+            lastLayer = dense_net.DenseNet201(dense_k, conv_kernel_width, bottleneck_size, transition_pool_size, transition_pool_stride, theta, initial_conv_width, initial_stride, initial_filters, initial_pool_width, initial_pool_stride, use_global_pooling, memory_efficient)(lastLayer)
         elif dense_type == 'd264': 
-            lastLayer = dense_net.DenseNet264(dense_k, conv_kernel_width, bottleneck_size, transition_pool_size, transition_pool_stride, theta, initial_conv_width, initial_stride, initial_filters, initial_pool_width, initial_pool_stride, use_global_pooling)(lastLayer)
+            lastLayer = dense_net.DenseNet264(dense_k, conv_kernel_width, bottleneck_size, transition_pool_size, transition_pool_stride, theta, initial_conv_width, initial_stride, initial_filters, initial_pool_width, initial_pool_stride, use_global_pooling, memory_efficient)(lastLayer)
 
         lastLayer = Flatten()(lastLayer)
         return lastLayer
@@ -68,7 +85,7 @@ class dense_net_manager(model_manager.model_common_manager):
         test_target = None 
         for i in range(self.data_manager.get_task_num()):
             task_lastLayer = Dense(self.config['hidden_width'], activation='relu')(lastLayer)
-            task_lastLayer = Dense(self.data_manager.get_max_category()[i], activation=last_activation, name="task_%d_1" % i)(task_lastLayer)
+            task_lastLayer = Dense(self.data_manager.get_max_category()[i], activation=last_activation, name="task_%d_1" % i, dtype='float32')(task_lastLayer)
             output.append(task_lastLayer)
         model = Model(inputs=input_layer, outputs=output)
         return model
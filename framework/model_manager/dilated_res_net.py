@@ -0,0 +1,122 @@
+from tensorflow.keras.layers import BatchNormalization, Activation, Conv1D, Add, Dropout
+from framework.model_manager import global_pooling as pooling
+
+
+def residual_block(filters, kernel_width, dilation_rate, drop_out_rate):
+    """
+    A pre-activation residual block of two dilated convolutions
+
+    :param filters: int representing the number of filters of the block
+    :param kernel_width: int representing the width of the convolutional kernels
+    :param dilation_rate: int representing the dilation of both convolutions
+    :param drop_out_rate: float representing the dropout rate between the convolutions
+    :return a function wrapping the keras layers of the block
+    """
+    def f(x):
+        shortcut = x
+        if int(x.shape[-1]) != filters:
+            shortcut = Conv1D(filters, 1, padding="same")(x)
+        x = BatchNormalization()(x)
+        x = Activation("relu")(x)
+        x = Conv1D(
+            filters,
+            kernel_width,
+            strides=1,
+            padding="same",
+            dilation_rate=dilation_rate)(x)
+        x = Dropout(drop_out_rate)(x)
+        x = BatchNormalization()(x)
+        x = Activation("relu")(x)
+        x = Conv1D(
+            filters,
+            kernel_width,
+            strides=1,
+            padding="same",
+            dilation_rate=dilation_rate)(x)
+        return Add()([shortcut, x])
+    return f
+
+
+def downsample_block(filters, kernel_width, stride):
+    """
+    A strided convolution which shortens the sequence by stride
+
+    :param filters: int representing the number of output filters
+    :param kernel_width: int representing the width of the convolutional kernel
+    :param stride: int representing the stride of the convolution
+    :return a function wrapping the keras layers of the block
+    """
+    def f(x):
+        x = BatchNormalization()(x)
+        x = Activation("relu")(x)
+        x = Conv1D(
+            filters,
+            kernel_width,
+            strides=stride,
+            padding="same")(x)
+        return x
+    return f
+
+
+def DilatedResNet(
+        initial_filters,
+        initial_conv_width,
+        conv_kernel_width,
+        stage_filters,
+        blocks_per_stage,
+        dilation_rates,
+        downsample_stride,
+        global_pooling,
+        drop_out_rate):
+    """
+    A residual network of dilated 1D convolutions. Every stage starts with a strided convolution, followed by
+    blocks_per_stage residual blocks whose dilation cycles through dilation_rates, and the features are reduced
+    by global pooling, so the model does not depend on the input length
+
+    :param initial_filters: int representing the number of filters of the first convolution
+    :param initial_conv_width: int representing the width of the first convolution
+    :param conv_kernel_width: int representing the width of the other convolutions
+    :param stage_filters: list of int representing the number of filters of every stage
+    :param blocks_per_stage: int representing the number of residual blocks of a stage
+    :param dilation_rates: list of int representing the dilations of the residual blocks of a stage
+    :param downsample_stride: int representing the stride of the first convolution of every stage
+    :param global_pooling: 'max', 'avg' or 'attention'
+    :param drop_out_rate: float representing the dropout rate inside the residual blocks
+    :return a function wrapping the entire network
+    """
+    def f(x):
+        x = Conv1D(
+            initial_filters,
+            initial_conv_width,
+            strides=1,
+            padding="same")(x)
+        for filters in stage_filters:
+            x = downsample_block(filters, conv_kernel_width, downsample_stride)(x)
+            for i in range(blocks_per_stage):
+                x = residual_block(filters, conv_kernel_width, dilation_rates[i % len(dilation_rates)], drop_out_rate)(x)
+        x = BatchNormalization()(x)
+        x = Activation("relu")(x)
+        return pooling.GlobalPooling(global_pooling)(x)
+    return f
+
+
+def get_receptive_field(
+        initial_conv_width,
+        conv_kernel_width,
+        stage_filters,
+        blocks_per_stage,
+        dilation_rates,
+        downsample_stride):
+    """
+    The number of input positions which one position of the last convolution sees
+
+    :return int representing the receptive field
+    """
+    receptive_field = initial_conv_width
+    jump = 1
+    for _ in stage_filters:
+        receptive_field += (conv_kernel_width - 1) * jump
+        jump *= downsample_stride
+        for i in range(blocks_per_stage):
+            receptive_field += 2 * (conv_kernel_width - 1) * dilation_rates[i % len(dilation_rates)] * jump
+    return receptive_field
@@ -0,0 +1,58 @@
+from tensorflow.keras.models import Model
+from tensorflow.keras.layers import Dense, Dropout, Embedding, Input
+from framework import utili
+from framework.model_manager import model_manager
+from framework.model_manager import model_manager_creator
+from framework.model_manager import dilated_res_net
+
+
+def create(data_manager, config):
+    return dilated_res_net_manager(data_manager, config)
+
+class dilated_res_net_manager(model_manager.model_common_manager):
+    '''dilated residual CNN with downsampling and global pooling. the input shape is (None,),
+    so length bucketing can be used for training and prediction
+    '''
+    name = 'dilated_res_net_manager'
+    def __init__(self, data_manager, config):
+        super().__init__(data_manager, config)
+
+    def get_network_config(self):
+        return {
+            'initial_conv_width':utili.get_table_value(self.config, 'initial_conv_width', 7),
+            'conv_kernel_width':utili.get_table_value(self.config, 'conv_kernel_width', 3),
+            'stage_filters':utili.get_table_value(self.config, 'stage_filters', [32, 64, 128, 128]),
+            'blocks_per_stage':utili.get_table_value(self.config, 'blocks_per_stage', 3),
+            'dilation_rates':utili.get_table_value(self.config, 'dilation_rates', [1, 2, 4]),
+            'downsample_stride':utili.get_table_value(self.config, 'downsample_stride', 2),
+        }
+
+    def get_receptive_field(self):
+        return dilated_res_net.get_receptive_field(**self.get_network_config())
+
+    def _create_input(self):
+        max_features = self.data_manager.get_max_feature()
+        embedding_dims = self.config['embedding_dims']
+        inputLayer = Input(shape=(None,))
+        return inputLayer, Embedding(max_features, embedding_dims)(inputLayer)
+
+    def _create_main_path(self, lastLayer):
+        initial_filters = utili.get_table_value(self.config, 'initial_filters', 32)
+        global_pooling = utili.get_table_value(self.config, 'global_pooling', 'max')
+        drop_out_rate = utili.get_table_value(self.config, 'drop_out_rate', 0.2)
+        lastLayer = dilated_res_net.DilatedResNet(initial_filters, global_pooling=global_pooling, drop_out_rate=drop_out_rate, **self.get_network_config())(lastLayer)
+        print('receptive_field:', self.get_receptive_field())
+        return Dropout(drop_out_rate)(lastLayer)
+
+    def _create_end(self, input_layer, lastLayer):
+        last_activation = utili.get_table_value(self.config,'last_activation', 'sigmoid')
+        print('last_activation:', last_activation)
+        output = []
+        for i in range(self.data_manager.get_task_num()):
+            task_lastLayer = Dense(self.config['hidden_width'], activation='relu')(lastLayer)
+            task_lastLayer = Dense(self.data_manager.get_max_category()[i], activation=last_activation, name="task_%d_1" % i, dtype='float32')(task_lastLayer)
+            output.append(task_lastLayer)
+        model = Model(inputs=input_layer, outputs=output)
+        return model
+
+model_manager_creator.instance.register(dilated_res_net_manager.name, create)
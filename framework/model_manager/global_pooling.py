@@ -0,0 +1,34 @@
+from tensorflow.keras.layers import GlobalMaxPooling1D, GlobalAveragePooling1D, Dense, Softmax, Dot, Flatten
+
+
+def attention_pooling():
+    """
+    Attention pooling over the positions of a sequence: a score is learned for every position, and the
+    features are averaged with the softmax of the scores as weights
+
+    :return a function wrapping the keras layers of the pooling
+    """
+    def f(x):
+        weights = Dense(1)(x)
+        weights = Softmax(axis=1)(weights)
+        x = Dot(axes=1)([weights, x])
+        return Flatten()(x)
+    return f
+
+
+def GlobalPooling(pooling):
+    """
+    Pooling over all positions, so the output does not depend on the sequence length
+
+    :param pooling: 'max', 'avg' or 'attention'
+    :return a function wrapping the keras layers of the pooling
+    """
+    def f(x):
+        if pooling == 'attention':
+            return attention_pooling()(x)
+        if pooling == 'avg':
+            return GlobalAveragePooling1D()(x)
+        if pooling == 'max':
+            return GlobalMaxPooling1D()(x)
+        raise Exception('unknown global pooling: %s' % pooling)
+    return f
@@ -1,3 +1,3 @@
 from framework.model_manager import basic_cnn_manager
 from framework.model_manager import dense_net_manager 
-
+from framework.model_manager import dilated_res_net_manager
@@ -1,5 +1,8 @@
+import numpy as np
+import pandas as pd
 import tensorflow as tf
 import os.path
+import inspect
 from datetime import datetime
 from tensorflow.keras.models import Sequential, Model
 from tensorflow.keras.layers import Dense, Dropout, Activation, Embedding, Flatten, BatchNormalization, AveragePooling1D
@@ -10,6 +13,52 @@ from tensorflow.keras.utils import to_categorical
 from tensorflow.keras.callbacks import EarlyStopping
 from tensorflow.keras.models import load_model
 from framework import utili
+from framework.tools import sparse_label
+from framework.tools.sequence_sampling import BatchGenerator
+
+def cpu_supports_bfloat16():
+    '''check whether the cpu has native bfloat16 instructions (AVX512_BF16 or AMX), on other cpus
+    bfloat16 is emulated and slower than float32
+    '''
+    try:
+        with open('/proc/cpuinfo') as f:
+            flags = f.read().split()
+    except IOError:
+        return False
+    return 'avx512_bf16' in flags or 'amx_bf16' in flags
+
+def get_precision_policy():
+    mixed_precision = tf.keras.mixed_precision
+    if hasattr(mixed_precision, 'global_policy'):
+        return mixed_precision.global_policy().name
+    return mixed_precision.experimental.global_policy().name
+
+def set_precision_policy(name):
+    '''set the global keras dtype policy, tensorflow before 2.4 only has the experimental api
+    '''
+    mixed_precision = tf.keras.mixed_precision
+    if hasattr(mixed_precision, 'set_global_policy'):
+        mixed_precision.set_global_policy(name)
+    else:
+        mixed_precision.experimental.set_policy(name)
+
+def is_keras_3():
+    '''keras 3 neither saves nor loads TF SavedModel directories as keras models
+    '''
+    return str(getattr(tf.keras, '__version__', '2')).split('.')[0] == '3'
+
+def get_saved_model_path(name):
+    '''directory of the TF SavedModel export of a model saved as name.h5
+    '''
+    return name + '_saved_model'
+
+def export_saved_model(model, name):
+    '''export a model to a TF SavedModel without the optimizer state, it is loaded by model_manager_creator
+    instead of the .h5 when it is not older than it. it needs tf.keras 2, e.g. TF_USE_LEGACY_KERAS=1 with tf_keras
+    '''
+    if is_keras_3():
+        raise Exception('export to a TF SavedModel is not supported by keras %s, use tf.keras 2 (e.g. TF_USE_LEGACY_KERAS=1 with tf_keras) or keep the .h5' % tf.keras.__version__)
+    model.save(get_saved_model_path(name), save_format='tf', include_optimizer=False)
 
 class model_common_manager:
     def __init__(self, data_manager, config):
@@ -25,16 +74,73 @@ class model_common_manager:
         self.context = {} 
 
     def create_model(self):
-        input_layer, lastLayer = self._create_input()
-        lastLayer = self._create_main_path(lastLayer)
-        self.context['model'] = self._create_end(input_layer, lastLayer)
+        #the dtype policy is taken by layers when they are created, the output layers are always float32
+        policy = self.get_mixed_precision()
+        previous_policy = None
+        if policy:
+            previous_policy = get_precision_policy()
+            set_precision_policy(policy)
+            print('mixed precision policy:', policy)
+        try:
+            input_layer, lastLayer = self._create_input()
+            lastLayer = self._create_main_path(lastLayer)
+            self.context['model'] = self._create_end(input_layer, lastLayer)
+        finally:
+            if previous_policy:
+                set_precision_policy(previous_policy)
         return self.context['model']
 
+    def get_mixed_precision(self):
+        '''the dtype policy of the model. in performance mode it is mixed_bfloat16 when the cpu supports bfloat16,
+        it can be given by mixed_precision, e.g. 'mixed_bfloat16', or False to turn it off
+        '''
+        default = None
+        if utili.get_table_value(self.config, 'performance_mode', False) and cpu_supports_bfloat16():
+            default = 'mixed_bfloat16'
+        policy = utili.get_table_value(self.config, 'mixed_precision', default)
+        if policy and not hasattr(tf.keras, 'mixed_precision'):
+            print('mixed precision is not supported by tensorflow %s' % tf.__version__)
+            return None
+        return policy
+
+    def get_compile_options(self):
+        '''keyword arguments of Model.compile for performance mode: XLA compilation and several training steps
+        per execution, they can be given by jit_compile and steps_per_execution. options which the installed
+        keras does not take are replaced (XLA auto-clustering for jit_compile) or skipped
+        '''
+        performance_mode = utili.get_table_value(self.config, 'performance_mode', False)
+        jit_compile = utili.get_table_value(self.config, 'jit_compile', performance_mode)
+        steps_per_execution = utili.get_table_value(self.config, 'steps_per_execution', 32 if performance_mode else 1)
+        params = inspect.signature(tf.keras.Model.compile).parameters
+        ret = {}
+        if jit_compile:
+            if 'jit_compile' in params:
+                ret['jit_compile'] = True
+            else:
+                tf.config.optimizer.set_jit(True)
+        if steps_per_execution > 1:
+            if 'steps_per_execution' in params:
+                ret['steps_per_execution'] = steps_per_execution
+            elif 'experimental_steps_per_execution' in params:
+                ret['experimental_steps_per_execution'] = steps_per_execution
+            else:
+                print('steps_per_execution is not supported by tensorflow %s' % tf.__version__)
+        return ret
+
     def compile(self): 
         task_num = self.data_manager.get_task_num()
         optimizer = self.config['optimizer']
         loss_function = self.config['loss_function']
-        self.get_model().compile(optimizer=optimizer, loss=[loss_function] * task_num , metrics=['categorical_accuracy'] * task_num)
+        compile_options = self.get_compile_options()
+        if compile_options:
+            print('compile options:', compile_options)
+        self.get_model().compile(optimizer=optimizer, loss=[loss_function] * task_num , metrics=['categorical_accuracy'] * task_num, **compile_options)
+
+    def get_validation_split_at(self, length):
+        '''fit keeps the rows from this index to the end of the training data for validation, the last 1/6
+        as validation_split=1/6 does. they are not trained on, so they can be used to tune thresholds
+        '''
+        return int(length * (1 - 1/6))
 
     def fit(self, x_train, y_train, epochs, batch_size):  
         callbacks = []
@@ -43,10 +149,63 @@ class model_common_manager:
             patience = self.config['patience']
             early_stopping_callback = tf.keras.callbacks.EarlyStopping(monitor='val_categorical_accuracy', restore_best_weights=True, patience=patience, verbose=1)
             callbacks.append(early_stopping_callback)
-        self.get_model().fit(x_train, y_train, epochs=epochs,  batch_size=batch_size, validation_split=1/6, callbacks=callbacks)
+        input_pipeline = utili.get_table_value(self.config, 'input_pipeline', 'numpy')
+        if input_pipeline == 'tf_data':
+            split_at = self.get_validation_split_at(len(x_train))
+            indices = np.arange(len(x_train))
+            training_dataset = self.create_dataset(x_train, y_train, indices[:split_at], batch_size, shuffle=True)
+            validation_dataset = self.create_dataset(x_train, y_train, indices[split_at:], batch_size)
+            self.get_model().fit(training_dataset, epochs=epochs, validation_data=validation_dataset, callbacks=callbacks)
+        elif sparse_label.is_sparse(y_train):
+            #sparse targets can not be fed to Model.fit directly, they are densified per batch
+            split_at = self.get_validation_split_at(len(x_train))
+            indices = np.arange(len(x_train))
+            training_generator = BatchGenerator(x_train, y_train, batch_size, indices[:split_at], shuffle=True)
+            validation_generator = BatchGenerator(x_train, y_train, batch_size, indices[split_at:])
+            self.get_model().fit(training_generator, epochs=epochs, validation_data=validation_generator, callbacks=callbacks)
+        else:
+            self.get_model().fit(x_train, y_train, epochs=epochs,  batch_size=batch_size, validation_split=1/6, callbacks=callbacks)
 
-    def fit_generator(self, generator, epochs):
-        self.get_model().fit_generator(generator, epochs=epochs)
+    def create_dataset(self, x, y, indices, batch_size, shuffle=False):
+        '''tf.data pipeline over the rows indices of x and the task targets. only the indices go through
+        shuffle and batch, the rows of a batch are gathered from x and y in one call, so neither x (which can be
+        memory-mapped) nor y is copied into the graph. sparse targets are densified per batch
+        '''
+        shuffle_buffer = utili.get_table_value(self.config, 'shuffle_buffer', len(indices))
+        dtypes = [tf.as_dtype(x.dtype)] + [tf.as_dtype(e[indices[:1]].dtype) for e in y]
+        shapes = [(None,) + x.shape[1:]] + [(None,) + e.shape[1:] for e in y]
+
+        def gather(batch_index):
+            batch_index = np.sort(batch_index)
+            return [np.asarray(x[batch_index])] + [e[batch_index] for e in y]
+
+        def gather_batch(batch_index):
+            batch = tf.numpy_function(gather, [batch_index], dtypes)
+            for e, shape in zip(batch, shapes):
+                e.set_shape(shape)
+            return batch[0], tuple(batch[1:])
+
+        dataset = tf.data.Dataset.from_tensor_slices(indices)
+        if shuffle:
+            dataset = dataset.shuffle(shuffle_buffer, reshuffle_each_iteration=True)
+        dataset = dataset.batch(batch_size)
+        dataset = dataset.map(gather_batch, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+        return dataset.prefetch(tf.data.experimental.AUTOTUNE)
+
+    def fit_generator(self, generator, epochs, workers=1, max_queue_size=10):
+        '''fit on a Sequence. with workers > 1, batches are assembled by a thread pool and up to
+        max_queue_size batches are prepared ahead of the model steps. keras 3 takes both from the Sequence,
+        which gets them in its constructor. a generator with to_dataset is fed as a tf.data.Dataset, which
+        gathers batches by workers parallel calls and prefetches max_queue_size batches
+        '''
+        model = self.get_model()
+        if hasattr(generator, 'to_dataset'):
+            #batches of a different width, e.g. BucketSequenceGenerator, are fed as a dataset with an open width
+            model.fit(generator.to_dataset(workers).prefetch(max_queue_size), epochs=epochs)
+        elif hasattr(model, 'fit_generator'):
+            model.fit_generator(generator, epochs=epochs, workers=workers, max_queue_size=max_queue_size)
+        else:
+            model.fit(generator, epochs=epochs)
 
     def predict(self, x_):
         begin = datetime.now()
@@ -84,6 +243,8 @@ class model_common_manager:
             }
             utili.save_obj(store, save_name)
             self.context['model'] = model
+            if utili.get_table_value(self.config, 'export_saved_model', False):
+                export_saved_model(model, save_name)
 
     def set_model(self, model):
         self.context['model'] = model
@@ -97,8 +258,72 @@ class model_common_manager:
         return self.data_manager
 
     def predict(self, x_data):
+        if not isinstance(x_data, np.ndarray):
+            #e.g. sequence_dataset.padded_sequence_array, which is only padded block by block
+            return self.predict_in_blocks(x_data)
+        if utili.get_table_value(self.config, 'length_bucketing', False) and self.is_length_agnostic():
+            return self.predict_in_buckets(x_data)
         return self.context['model'].predict(x_data)
 
-    def predict_on_file(self, load_file):
-        data, entry_name = self.data_manager.load_x_from_file(load_file)
+    def predict_in_blocks(self, x_data, block_size=65536):
+        '''predict a matrix which is read block by block, e.g. a lazily padded one
+        '''
+        ret = []
+        for begin in range(0, len(x_data), block_size):
+            pred = self.predict(np.asarray(x_data[begin:begin + block_size]))
+            is_list = type(pred) == list
+            if not is_list:
+                pred = [pred]
+            ret.append(pred)
+        if not ret:
+            return None
+        ret = [np.concatenate(e) for e in zip(*ret)]
+        if not is_list:
+            ret = ret[0]
+        return ret
+
+    def is_length_agnostic(self):
+        '''a model with input shape (None,) can be fed with batches padded to any length
+        '''
+        return self.get_model().input_shape[1] is None
+
+    def predict_in_buckets(self, x_data):
+        '''group sequences by length and predict every bucket only padded to its bound
+        '''
+        bucket_bounds = utili.get_bucket_bounds(x_data.shape[1], utili.get_table_value(self.config, 'bucket_bounds'))
+        bucket_ids = np.searchsorted(bucket_bounds, utili.get_padded_lengths(x_data), side='left')
+        ret = None
+        for bucket_id in np.unique(bucket_ids):
+            rows = np.flatnonzero(bucket_ids == bucket_id)
+            pred = self.context['model'].predict(utili.trim_padding(x_data[rows], bucket_bounds[bucket_id]))
+            is_list = type(pred) == list
+            if not is_list:
+                pred = [pred]
+            if ret is None:
+                ret = [np.zeros((len(x_data),) + e.shape[1:], dtype=e.dtype) for e in pred]
+            for r, e in zip(ret, pred):
+                r[rows] = e
+        if ret is not None and not is_list:
+            ret = ret[0]
+        return ret
+
+    def predict_on_file(self, load_file, report=None):
+        '''predict a file, predicted sequences with unknown residues are added to report when it is given
+        '''
+        df = self.data_manager.get_x_rows(pd.read_csv(load_file, sep='\t'))
+        if report is not None:
+            report.add(df)
+        data, entry_name = self.data_manager.get_x(df)
         return self.predict(data), entry_name
+
+    def predict_on_file_in_chunks(self, load_file, chunk_size, report=None):
+        '''predict a file chunk by chunk with bounded memory, yield prediction and entry names of every chunk
+        '''
+        for df in pd.read_csv(load_file, sep='\t', chunksize=chunk_size):
+            df = self.data_manager.get_x_rows(df)
+            if report is not None:
+                report.add(df)
+            data, entry_name = self.data_manager.get_x(df)
+            if len(data) == 0:
+                continue
+            yield self.predict(data), entry_name
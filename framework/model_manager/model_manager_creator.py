@@ -1,24 +1,89 @@
+import os
+from collections import OrderedDict
+import tensorflow as tf
 from framework import utili
 from framework.data_manager import data_manager_creator
 from framework import register
+from framework.model_manager import model_manager as common_model_manager
 from tensorflow.keras.models import load_model
 
 class creator(register.base):
+    def __init__(self, cache_size=4):
+        super().__init__()
+        #models loaded by create_from_file, the least recently used one is dropped when there are more than cache_size
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+
     def create(self, data_manager, config):
         name = config['name']
         fn = self.get_entry(name)
         return fn(data_manager, config)
 
-    def create_from_file(self, name):
-        model_name = name + '.h5'
-        store_name = name 
-    
-        store = utili.load_obj(store_name)
+    def set_cache_size(self, cache_size):
+        self.cache_size = cache_size
+        self._evict()
+
+    def clear_cache(self):
+        self.cache.clear()
+
+    def _evict(self):
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def get_model_file(self, name):
+        '''the SavedModel export of the model when it is not older than the .h5, otherwise the .h5.
+        keras 3 can not load the export, so it always uses the .h5
+        '''
+        model_file = name + '.h5'
+        if common_model_manager.is_keras_3():
+            if not os.path.exists(model_file) and os.path.isdir(common_model_manager.get_saved_model_path(name)):
+                raise Exception('%s only has a TF SavedModel export, which keras %s can not load' % (name, tf.keras.__version__))
+            return model_file
+        saved_model = common_model_manager.get_saved_model_path(name)
+        saved_model_pb = os.path.join(saved_model, 'saved_model.pb')
+        if os.path.exists(saved_model_pb):
+            if not os.path.exists(model_file) or os.path.getmtime(saved_model_pb) >= os.path.getmtime(model_file):
+                return saved_model
+        return model_file
+
+    def _get_cache_key(self, name, model_file):
+        if os.path.isdir(model_file):
+            model_time = os.path.getmtime(os.path.join(model_file, 'saved_model.pb'))
+        else:
+            model_time = os.path.getmtime(model_file)
+        return (os.path.abspath(name), model_file, model_time, os.path.getmtime(name + '.pkl'))
+
+    def create_from_file(self, name, use_cache=True):
+        '''create the model manager of a saved model. the model is loaded without its optimizer state, so it is
+        ready for prediction but has to be compiled for training. with use_cache, the model manager is kept in a
+        process level cache keyed on the path and modification times of the model files, so a process predicting
+        many files loads a model once
+        '''
+        model_file = self.get_model_file(name)
+        key = self._get_cache_key(name, model_file)
+        if use_cache and key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        store = utili.load_obj(name)
         data_manager = data_manager_creator.instance.create(store['data_manager_info'])
         model_manager = self.create(data_manager, store['config'])
-        model = load_model(model_name)
+        model = load_model(model_file, compile=False)
         model_manager.set_model(model)
+
+        if use_cache:
+            #a model saved again at the same path replaces the stale entry
+            for k in [k for k in self.cache if k[0] == key[0]]:
+                del self.cache[k]
+            self.cache[key] = model_manager
+            self._evict()
         return model_manager
 
+    def export_saved_model(self, name):
+        '''export a model saved as .h5 to a TF SavedModel next to it, which create_from_file prefers
+        '''
+        model = load_model(name + '.h5', compile=False)
+        common_model_manager.export_saved_model(model, name)
+
 
 instance = creator()
@@ -109,6 +109,57 @@ def get_conflict(long_level, short_level, compare_level):
             test_map_s.append(part_level) 
     return set(test_map_l).difference(set(test_map_s))
 
+def get_parent_index(child_names, parent_names, parent_level, dummy=None):
+    '''index of the parent class of every child class, the child truncated to parent_level as get_conflict does.
+    it is -1 when the child can not be truncated (e.g. 1.2.unknown.unknown to level 3), which is never a conflict,
+    and len(parent_names) when the parent is not a class, which is always a conflict. with dummy, missing parts
+    are filled by dummy as the data manager does, so 1.2.unknown.unknown has the parent 1.2.unknown
+    '''
+    parent_map = {name:i for i, name in enumerate(parent_names)}
+    ret = np.full(len(child_names), -1, dtype=np.int64)
+    for i, name in enumerate(child_names):
+        parent = _get_label_to_level(name, parent_level, dummy)
+        if parent:
+            ret[i] = parent_map.get(parent, len(parent_names))
+    return ret
+
+def get_conflict_rows(child_pred, parent_pred, parent_index):
+    '''rows of boolean prediction matrices where a predicted child class has a parent class which is not predicted,
+    the same rows as get_conflict over label lists, but only the predicted cells are visited
+    '''
+    rows, cols = np.nonzero(child_pred)
+    parents = parent_index[cols]
+    valid = parents >= 0
+    rows = rows[valid]
+    parents = parents[valid]
+    predicted = np.zeros(len(rows), dtype=bool)
+    known = parents < parent_pred.shape[1]
+    predicted[known] = parent_pred[rows[known], parents[known]]
+    return np.unique(rows[~predicted])
+
+def hierarchical_decode(y_pred, parent_index, threshold=0.5):
+    '''threshold the scores of all levels so the label sets are consistent with the class tree: a class is only
+    predicted when its parent class at the previous level is predicted too. with one threshold this is the same as
+    thresholding scores propagated down the tree by min. parent_index[i] is the parent index of the classes of
+    level i (see get_parent_index), classes without a valid parent are not constrained. deeper levels are only
+    evaluated on the rows which still have a predicted class. threshold can be a list with the threshold (a number
+    or a per class vector) of every level
+    '''
+    if np.isscalar(threshold):
+        threshold = [threshold] * len(y_pred)
+    ret = [y_pred[0] > threshold[0]]
+    rows = np.flatnonzero(ret[0].any(axis=1))
+    for i in range(1, len(y_pred)):
+        index = parent_index[i]
+        constrained = np.flatnonzero((index >= 0) & (index < ret[i-1].shape[1]))
+        pred = np.asarray(y_pred[i][rows]) > threshold[i]
+        pred[:, constrained] &= ret[i-1][rows][:, index[constrained]]
+        labels = np.zeros(y_pred[i].shape, dtype=bool)
+        labels[rows] = pred
+        ret.append(labels)
+        rows = rows[pred.any(axis=1)]
+    return ret
+
 if __name__ == '__main__':
     long_level = ['1.2.2.unknown', '2.2.3.4', '2.2.3.1']
     short_level = ['1.2.2', '2.2.3', ]
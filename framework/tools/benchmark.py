@@ -0,0 +1,274 @@
+import sys
+import tracemalloc
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from framework import utili
+from framework.bio import BioDefine
+
+
+def benchmark_encoding(file_path, ngram=1):
+    '''compare the per-residue GetOridinalEncoding path with GetBatchOridinalEncoding on the sequences of a file
+    '''
+    df = pd.read_csv(file_path, sep='\t')
+    seqs = df['Sequence']
+    print('sequence num:', len(seqs), 'ngram:', ngram)
+
+    begin = datetime.now()
+    feature_list = utili.GetNGrams(BioDefine.aaList, ngram)
+    expected = seqs.apply(lambda x:utili.GetOridinalEncoding(x, feature_list, ngram))
+    per_residue_cost = datetime.now() - begin
+    print('GetOridinalEncoding time cost:', per_residue_cost)
+
+    begin = datetime.now()
+    codes, offsets = utili.GetBatchOridinalEncoding(seqs, BioDefine.aaList, ngram)
+    batch_cost = datetime.now() - begin
+    print('GetBatchOridinalEncoding time cost:', batch_cost)
+
+    for e, r in zip(expected, utili.split_batch_encoding(codes, offsets)):
+        if not np.array_equal(e, r):
+            raise Exception('batch encoding is different from GetOridinalEncoding')
+    print('speedup: %.1fx' % (per_residue_cost.total_seconds() / max(batch_cost.total_seconds(), 1e-6)))
+
+
+def benchmark_padding(file_path, ngram=1, max_len=1000):
+    '''compare the peak memory of pad_sequences over per-sequence arrays with GetPaddedOridinalEncoding
+    '''
+    from tensorflow.keras.preprocessing import sequence
+    df = pd.read_csv(file_path, sep='\t')
+    seqs = df['Sequence']
+
+    tracemalloc.start()
+    feature_list = utili.GetNGrams(BioDefine.aaList, ngram)
+    encode = seqs.apply(lambda x:utili.GetOridinalEncoding(x, feature_list, ngram))
+    expected = sequence.pad_sequences(encode, maxlen=max_len, padding='post')
+    _, pad_sequences_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del encode
+
+    tracemalloc.start()
+    x = utili.GetPaddedOridinalEncoding(seqs, BioDefine.aaList, ngram, max_len, 'post')
+    _, padded_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    if not np.array_equal(expected, x):
+        raise Exception('padded encoding is different from pad_sequences')
+    print('pad_sequences peak memory: %d bytes, dtype:%s' % (pad_sequences_peak, expected.dtype))
+    print('GetPaddedOridinalEncoding peak memory: %d bytes, dtype:%s' % (padded_peak, x.dtype))
+
+
+def create_benchmark_model(file_path, model_config, max_len=1000):
+    '''create an E_P data manager and a model manager of model_config on file_path for benchmarks
+    '''
+    from framework import init
+    from framework.data_manager import data_manager_creator
+    from framework.model_manager import model_manager_creator
+    data_config = {
+        'name':'enzyme_protein_data_manager',
+        'file_path':file_path,
+        'max_len':max_len,
+        'fraction':1,
+        'ngram':1,
+        'train_percent':0.9,
+        'task_num':1,
+    }
+    config = {
+        'embedding_dims':16,
+        'hidden_width':64,
+        'optimizer':'Adam',
+        'loss_function':'categorical_crossentropy',
+        'last_activation':'softmax',
+    }
+    for k in model_config:
+        config[k] = model_config[k]
+    dm = data_manager_creator.instance.create(data_config)
+    dm.get_data()
+    mc = model_manager_creator.instance.create(dm, config)
+    mc.create_model()
+    mc.compile()
+    return dm, mc
+
+def time_epochs(fit, epochs):
+    '''time every epoch of fit, the first epoch includes graph tracing
+    '''
+    ret = []
+    for i in range(epochs):
+        begin = datetime.now()
+        fit()
+        ret.append((datetime.now() - begin).total_seconds())
+    return ret
+
+def benchmark_bucketing(file_path, batch_size=32, epochs=3):
+    '''compare epoch time of the DenseNet path with full max_len padding and with length-bucketed batches
+    '''
+    from framework.tools.sequence_sampling import BucketSequenceGenerator
+    #the dense_net configuration of enzyme_protein_classifier_model_generator.py with global pooling
+    dense_net_config = {
+        'name':'dense_net_manager',
+        'dense_type':'d121',
+        'dense_k':12,
+        'transition_pool_stride':2,
+        'initial_filters':12,
+        'initial_pool_stride':2,
+        'use_global_pooling':True,
+    }
+    dm, mc = create_benchmark_model(file_path, dense_net_config)
+    x, y = dm.get_training_data()
+    model = mc.get_model()
+    padded = time_epochs(lambda:model.fit(x, y[0], batch_size=batch_size, epochs=1, verbose=0), epochs)
+    sg = BucketSequenceGenerator(x, y, batch_size)
+    bucketed = time_epochs(lambda:model.fit(sg, epochs=1, verbose=0), epochs)
+    print('sequence num:', len(x), 'max_len:', x.shape[1], 'bucket bounds:', sg.bucket_bounds.tolist())
+    print('padded to max_len epoch time:', padded)
+    print('bucketed epoch time:', bucketed)
+    print('speedup after first epoch: %.2fx' % (np.mean(padded[1:]) / np.mean(bucketed[1:])))
+
+def benchmark_input_pipeline(file_path, batch_size=32, epochs=3):
+    '''compare epoch time of the basic CNN trained from numpy arrays with validation_split and from the tf.data pipeline
+    '''
+    #the basic_cnn configuration of enzyme_protein_classifier_model_generator.py
+    basic_cnn_config = {
+        'name':'basic_cnn_manager',
+        'conv_kernel_width':3,
+        'conv_strides':1,
+        'layer_len':1,
+        'conv_len':1,
+        'filter_delta':16,
+        'pool_size':16,
+        'pooling_strides':16,
+        'hidden_width':256,
+    }
+    dm, mc = create_benchmark_model(file_path, basic_cnn_config)
+    x, y = dm.get_training_data()
+    model = mc.get_model()
+    numpy_time = time_epochs(lambda:model.fit(x, y, batch_size=batch_size, epochs=1, validation_split=1/6, verbose=0), epochs)
+    split_at = int(len(x) * (1 - 1/6))
+    indices = np.arange(len(x))
+    training_dataset = mc.create_dataset(x, y, indices[:split_at], batch_size, shuffle=True)
+    validation_dataset = mc.create_dataset(x, y, indices[split_at:], batch_size)
+    tf_data_time = time_epochs(lambda:model.fit(training_dataset, epochs=1, validation_data=validation_dataset, verbose=0), epochs)
+    print('sequence num:', len(x), 'max_len:', x.shape[1], 'batch_size:', batch_size)
+    print('numpy epoch time:', numpy_time)
+    print('tf.data epoch time:', tf_data_time)
+    print('speedup after first epoch: %.2fx' % (np.mean(numpy_time[1:]) / np.mean(tf_data_time[1:])))
+
+def benchmark_performance_mode(file_path, batch_size=32, epochs=3):
+    '''compare training step time of DenseNet121 in float32 and in performance mode
+    (XLA, bfloat16 mixed precision when the cpu supports it and steps_per_execution)
+    '''
+    #the dense_net configuration of enzyme_protein_classifier_model_generator.py
+    dense_net_config = {
+        'name':'dense_net_manager',
+        'dense_type':'d121',
+        'dense_k':12,
+        'transition_pool_stride':2,
+        'initial_filters':12,
+        'initial_pool_stride':2,
+    }
+    ret = {}
+    for performance_mode in (False, True):
+        dense_net_config['performance_mode'] = performance_mode
+        dm, mc = create_benchmark_model(file_path, dense_net_config)
+        x, y = dm.get_training_data()
+        model = mc.get_model()
+        steps = int(np.ceil(len(x) / batch_size))
+        ret[performance_mode] = [e / steps for e in time_epochs(lambda:model.fit(x, y[0], batch_size=batch_size, epochs=1, verbose=0), epochs)]
+        print('performance_mode:', performance_mode, 'policy:', mc.get_mixed_precision(), 'compile options:', mc.get_compile_options())
+    print('sequence num:', len(x), 'max_len:', x.shape[1], 'batch_size:', batch_size)
+    print('float32 step time:', ret[False])
+    print('performance mode step time:', ret[True])
+    print('speedup after first epoch: %.2fx' % (np.mean(ret[False][1:]) / np.mean(ret[True][1:])))
+
+def get_rss():
+    '''current resident memory of the process in bytes
+    '''
+    import resource
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize()
+
+def get_training_peak_memory(file_path, model_config, batch_size, steps):
+    '''peak memory of training steps of a model, the GPU peak when there is a GPU, otherwise the peak
+    resident memory of the process above the memory before training. it runs in its own process
+    '''
+    import resource
+    import tensorflow as tf
+    dm, mc = create_benchmark_model(file_path, model_config)
+    x, y = dm.get_training_data()
+    x = x[:batch_size * steps]
+    y = [e[:batch_size * steps] for e in y]
+    model = mc.get_model()
+    gpus = tf.config.list_physical_devices('GPU')
+    before = get_rss()
+    model.fit(x, y[0], batch_size=batch_size, epochs=1, verbose=0)
+    if gpus and hasattr(tf.config.experimental, 'get_memory_info'):
+        return tf.config.experimental.get_memory_info('GPU:0')['peak']
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 - before
+
+def benchmark_dense_net_memory(file_path, batch_size=16, steps=2, dense_types=('d121', 'd169', 'd201', 'd264')):
+    '''compare peak training memory of every dense_type with and without memory_efficient,
+    every model is trained in a new process, so the peaks do not include the former models
+    '''
+    import multiprocessing
+    context = multiprocessing.get_context('spawn')
+    #the dense_net configuration of enzyme_protein_classifier_model_generator.py
+    dense_net_config = {
+        'name':'dense_net_manager',
+        'dense_k':12,
+        'transition_pool_stride':2,
+        'initial_filters':12,
+        'initial_pool_stride':2,
+    }
+    print('batch_size:', batch_size)
+    for dense_type in dense_types:
+        peaks = []
+        for memory_efficient in (False, True):
+            config = dict(dense_net_config, dense_type=dense_type, memory_efficient=memory_efficient)
+            with context.Pool(1) as pool:
+                peaks.append(pool.apply(get_training_peak_memory, (file_path, config, batch_size, steps)))
+        print('%s peak training memory: %.1f MB, memory_efficient: %.1f MB, %.2fx' % (dense_type, peaks[0] / 2**20, peaks[1] / 2**20, peaks[0] / max(peaks[1], 1)))
+
+def benchmark_model_report(file_path, report_file='model_report.tab'):
+    '''params, FLOPs, receptive field and latency of the DenseNet121 configurations of the generator scripts
+    and of the dilated residual network
+    '''
+    from framework.tools import model_report
+    dense_net_config = {
+        'name':'dense_net_manager',
+        'dense_type':'d121',
+        'dense_k':12,
+    }
+    configs = [
+        #enzyme_classifier_model_generator.py, the length is never reduced before Flatten
+        dict(dense_net_config, initial_filters=48),
+        #enzyme_protein_classifier_model_generator.py
+        dict(dense_net_config, initial_filters=12, transition_pool_stride=2, initial_pool_stride=2),
+        {'name':'dilated_res_net_manager'},
+    ]
+    reports = []
+    for config in configs:
+        dm, mc = create_benchmark_model(file_path, config)
+        reports.append(model_report.get_model_report(mc))
+    model_report.save_report(reports, report_file)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print('python -m framework.tools.benchmark encoding|padding|bucketing|input_pipeline|performance_mode|dense_net_memory|model_report <file_path> [ngram]')
+        sys.exit()
+    ngram = 1
+    if len(sys.argv) >= 4:
+        ngram = int(sys.argv[3])
+    if sys.argv[1] == 'encoding':
+        benchmark_encoding(sys.argv[2], ngram)
+    elif sys.argv[1] == 'padding':
+        benchmark_padding(sys.argv[2], ngram)
+    elif sys.argv[1] == 'bucketing':
+        benchmark_bucketing(sys.argv[2])
+    elif sys.argv[1] == 'input_pipeline':
+        benchmark_input_pipeline(sys.argv[2])
+    elif sys.argv[1] == 'performance_mode':
+        benchmark_performance_mode(sys.argv[2])
+    elif sys.argv[1] == 'dense_net_memory':
+        benchmark_dense_net_memory(sys.argv[2])
+    elif sys.argv[1] == 'model_report':
+        benchmark_model_report(sys.argv[2])
@@ -1,31 +1,125 @@
 import numpy as np
 import pandas as pd
 
-def at_least_one_label_in_test_set(df,train_percent, label_name, max_category):
+def _explode_labels(df, label_name):
+    '''get the row positions and classes of a column of class index lists
+    '''
+    s = pd.Series(df[label_name].values).explode().dropna()
+    return s.index.values.astype(np.int64), s.values.astype(np.int64)
+
+def _get_units(df, group_name):
+    '''rows of the same group are split together, a unit is a group, or a row when there is no group
+    '''
+    if group_name:
+        unit_ids, _ = pd.factorize(df[group_name])
+        return unit_ids.astype(np.int64)
+    return np.arange(df.shape[0], dtype=np.int64)
+
+def _random_split(unit_rows, candidates, training_amount, random_state):
+    '''take random units of candidates into the training set until training_amount rows are taken
+    '''
+    candidates = random_state.permutation(candidates)
+    return candidates[np.cumsum(unit_rows[candidates]) <= training_amount]
+
+def _get_csr_positions(offsets, rows):
+    '''positions of the elements of rows in a CSR layout
+    '''
+    lengths = offsets[rows + 1] - offsets[rows]
+    return np.repeat(offsets[rows] - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+
+def _stratified_split(unit_ids, unit_rows, label_row, label_key, in_test, train_percent, random_state):
+    '''iterative stratification over label keys. keys are visited from the rarest, the units of a key which are
+    not assigned yet are shuffled and put into the test set while the key has less test examples than desired,
+    the others go to the training set
+    '''
+    unit_num = len(unit_rows)
+    key_num = label_key.max() + 1 if len(label_key) else 0
+    pair = np.unique(unit_ids[label_row] * key_num + label_key, return_counts=True)
+    pair_unit = pair[0] // key_num
+    pair_key = pair[0] % key_num
+    pair_count = pair[1]
+    unit_offsets = np.zeros(unit_num + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pair_unit, minlength=unit_num), out=unit_offsets[1:])
+    by_key = np.argsort(pair_key, kind='stable')
+    key_offsets = np.zeros(key_num + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pair_key, minlength=key_num), out=key_offsets[1:])
+
+    key_count = np.bincount(label_key, minlength=key_num)
+    desired = key_count * (1 - train_percent)
+    assigned = in_test.copy()
+    test_count = np.zeros(key_num, dtype=np.int64)
+    test_pairs = np.flatnonzero(in_test[pair_unit])
+    np.add.at(test_count, pair_key[test_pairs], pair_count[test_pairs])
+
+    order = random_state.permutation(key_num)
+    order = order[np.argsort(key_count[order], kind='stable')]
+    for key in order:
+        pairs = by_key[key_offsets[key]:key_offsets[key + 1]]
+        pairs = random_state.permutation(pairs[~assigned[pair_unit[pairs]]])
+        if len(pairs) == 0:
+            continue
+        units = pair_unit[pairs]
+        needed = desired[key] - test_count[key]
+        needed = np.floor(needed) + (random_state.random_sample() < needed - np.floor(needed))
+        test_units = units[np.cumsum(pair_count[pairs]) <= needed]
+        assigned[units] = True
+        in_test[test_units] = True
+        test_pairs = _get_csr_positions(unit_offsets, test_units)
+        np.add.at(test_count, pair_key[test_pairs], pair_count[test_pairs])
+    return in_test
+
+def split_data(df, train_percent, label_name, label_names=None, group_name=None, seed=None):
+    '''split df into training set and test set, the rows holding the first occurrence of every class of label_name
+    are put into the test set, so every class appears in the test set. the other rows are split randomly, or by
+    iterative stratification over the classes of label_names (e.g. the label columns of all levels) when it is given.
+    when group_name is given, rows with the same value of it (e.g. Cluster name) are kept in the same set
+    '''
+    random_state = np.random.RandomState(seed)
+    unit_ids = _get_units(df, group_name)
+    unit_rows = np.bincount(unit_ids)
     training_amount = int(df.shape[0] * train_percent)
-    counting_map = {}
-    rows_index = []
-    for i in range(df.shape[0]):
-        row = df.iloc[i]
-        label_values = row[label_name]
-        should_add = False
-        for label in label_values:
-            if not label in counting_map:
-                counting_map[label] = 1
-                should_add = True
-        if should_add:
-            rows_index.append(i)
-        if len(counting_map) >= max_category:
-            break
-
-    test_set_temp = df.iloc[rows_index]
-    df = df.drop(df.index[rows_index])
-    training_amount = training_amount - test_set_temp.shape[0]
-
-    df = df.reindex(np.random.permutation(df.index))
-    
-
-    training_set = df.iloc[:training_amount]
-    test_set = df.iloc[training_set.shape[0]:]
-    test_set = pd.concat([test_set_temp, test_set])
-    return training_set, test_set
+
+    row, label = _explode_labels(df, label_name)
+    first_rows = np.unique(row[np.unique(label, return_index=True)[1]])
+    in_test = np.zeros(len(unit_rows), dtype=bool)
+    in_test[unit_ids[first_rows]] = True
+
+    if label_names:
+        label_row = []
+        label_key = []
+        offset = 0
+        for name in label_names:
+            row, label = _explode_labels(df, name)
+            label_row.append(row)
+            label_key.append(label + offset)
+            if len(label):
+                offset += label.max() + 1
+        in_test = _stratified_split(unit_ids, unit_rows, np.concatenate(label_row), np.concatenate(label_key), in_test, train_percent, random_state)
+        training_units = np.flatnonzero(~in_test)
+    else:
+        #the rows forced into the test set count towards the test share, as in the row-wise splitter
+        training_amount -= unit_rows[in_test].sum()
+        training_units = _random_split(unit_rows, np.flatnonzero(~in_test), training_amount, random_state)
+
+    is_training = np.zeros(len(unit_rows), dtype=bool)
+    is_training[training_units] = True
+    is_training = is_training[unit_ids]
+    is_first = np.zeros(df.shape[0], dtype=bool)
+    is_first[first_rows] = True
+    training_rows = random_state.permutation(np.flatnonzero(is_training))
+    test_rows = np.concatenate([np.flatnonzero(~is_training & is_first), random_state.permutation(np.flatnonzero(~is_training & ~is_first))])
+    return df.iloc[training_rows], df.iloc[test_rows]
+
+def get_class_counts(training_set, test_set, label_name, max_category):
+    '''get the number of training and test examples of every class of label_name
+    '''
+    ret = pd.DataFrame(index=pd.RangeIndex(max_category, name='class'))
+    for name, df in (('train', training_set), ('test', test_set)):
+        _, label = _explode_labels(df, label_name)
+        ret[name] = np.bincount(label, minlength=max_category)
+    return ret
+
+def at_least_one_label_in_test_set(df,train_percent, label_name, max_category, seed=None):
+    '''every class of label_name appears in the test set, the other rows are split randomly
+    '''
+    return split_data(df, train_percent, label_name, seed=seed)
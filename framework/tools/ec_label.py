@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+
+#an EC number part is an integer, the same as what int() of hierarchical_learning accepts for EC numbers
+_part_pattern = r'\s*\+?\d+\s*$'
+
+
+class ec_label_table:
+    '''EC labels of a column exploded into one entry per label. row is the position of the row the label belongs to,
+    digits holds the integer parts d1..dn, a part is -1 when it is missing or not a number, and so are all the parts after it.
+    an empty label has -2 in all its parts
+    '''
+    def __init__(self, row, labels, digits, part_num, all_parts_valid, row_num):
+        self.row = row
+        self.labels = labels
+        self.digits = digits
+        self.part_num = part_num
+        self.all_parts_valid = all_parts_valid
+        self.row_num = row_num
+        self.level_keys = {}
+
+    @staticmethod
+    def from_column(column, level_num, sep=';'):
+        '''parse a column of EC strings such as '1.1.1.1;2.7.-.-' once
+        '''
+        split = pd.Series(np.asarray(column, dtype=object)).str.split(sep)
+        exploded = split.explode()
+        row = exploded.index.values.astype(np.int64)
+        labels = exploded.values.astype(object)
+        #labels repeat a lot, only distinct labels are parsed
+        codes, uniques = pd.factorize(labels)
+        parts = pd.Series(np.asarray(uniques, dtype=object)).str.split('.', expand=True)
+        for i in range(parts.shape[1], level_num):
+            parts[i] = None
+        present = parts.notna().values
+        valid = np.column_stack([parts[i].str.match(_part_pattern).fillna(False).values.astype(bool) for i in parts.columns])
+
+        digits = np.full((len(uniques), level_num), -1, dtype=np.int64)
+        prefix_valid = np.cumprod(valid[:, :level_num], axis=1).astype(bool)
+        for i in range(level_num):
+            rows = np.flatnonzero(prefix_valid[:, i])
+            digits[rows, i] = parts[i].values[rows].astype(np.int64)
+        digits[np.asarray(uniques, dtype=object) == ''] = -2
+
+        part_num = present.sum(axis=1)
+        all_parts_valid = (valid | ~present).all(axis=1)
+        return ec_label_table(row, labels, digits[codes], part_num[codes], all_parts_valid[codes], len(split))
+
+    def take(self, mask):
+        '''select labels by a boolean mask, the row positions are kept
+        '''
+        return ec_label_table(self.row[mask], self.labels[mask], self.digits[mask], self.part_num[mask],
+                self.all_parts_valid[mask], self.row_num)
+
+    def take_rows(self, row_mask):
+        '''select rows by a boolean mask over the rows, row positions are renumbered to the selected rows
+        '''
+        row_mask = np.asarray(row_mask, dtype=bool)
+        ret = self.take(row_mask[self.row])
+        ret.row = (np.cumsum(row_mask) - 1)[ret.row]
+        ret.row_num = int(np.count_nonzero(row_mask))
+        return ret
+
+    def has_level(self, level):
+        '''labels which have at least level parts and all of them are numbers, like hierarchical_learning.has_level
+        '''
+        return (self.part_num >= level) & self.all_parts_valid
+
+    def get_label_counts(self, mask=None):
+        '''number of labels of every row
+        '''
+        row = self.row if mask is None else self.row[mask]
+        return np.bincount(row, minlength=self.row_num)
+
+    def get_label_lists(self):
+        '''labels of every row as lists
+        '''
+        return self._split_by_row(self.labels, self.row)
+
+    def _split_by_row(self, values, row):
+        ends = np.cumsum(np.bincount(row, minlength=self.row_num)).tolist()
+        values = values.tolist()
+        return [values[begin:end] for begin, end in zip([0] + ends[:-1], ends)]
+
+    def get_level_keys(self, level):
+        '''ids of labels truncated to level, ids are numbered in the order of their first appearance
+        '''
+        if not level in self.level_keys:
+            keys = pd.DataFrame(self.digits[:, :level]).groupby(list(range(level)), sort=False).ngroup()
+            self.level_keys[level] = keys.values
+        return self.level_keys[level]
+
+    def get_level_names(self, level, dummy):
+        '''names of the level keys, e.g. '1.2.3.-' with dummy '-'. the same as hierarchical_learning.get_label_to_level
+        '''
+        keys = self.get_level_keys(level)
+        if len(keys) == 0:
+            return np.zeros(0, dtype=object)
+        first = np.unique(keys, return_index=True)[1]
+        digits = self.digits[first, :level]
+        names = pd.Series(np.where(digits[:, 0] >= 0, digits[:, 0].astype(str), dummy).astype(object))
+        for i in range(1, level):
+            names = names.str.cat(pd.Series(np.where(digits[:, i] >= 0, digits[:, i].astype(str), dummy)), sep='.')
+        names[digits[:, 0] == -2] = ''
+        return names.values.astype(object)
+
+    def apply_threshold(self, level_num, threshold):
+        '''remove labels whose class at any level has not more than threshold examples, from the deepest level to the first,
+        until no more rows lose all their labels. return the mask of kept labels
+        '''
+        alive = np.ones(len(self.labels), dtype=bool)
+        size = self.row_num
+        while True:
+            for level in range(level_num, 0, -1):
+                keys = self.get_level_keys(level)
+                counts = np.bincount(keys[alive], minlength=len(keys))
+                alive &= counts[keys] > threshold
+            new_size = np.count_nonzero(self.get_label_counts(alive))
+            if size == new_size:
+                break
+            size = new_size
+        return alive
+
+    def get_level_labels(self, level, dummy, class_map):
+        '''get the labels of every row truncated to level without duplicates, and their class indices.
+        class_map counts examples of every class in place, the indices follow the order of class_map
+        '''
+        keys = self.get_level_keys(level)
+        names = self.get_level_names(level, dummy)
+        for name, count in zip(names, np.bincount(keys, minlength=len(names))):
+            class_map[name] = class_map.get(name, 0) + int(count)
+        class_index = pd.Index(list(class_map.keys())).get_indexer(names)
+
+        unique = ~pd.DataFrame({'row':self.row, 'key':keys}).duplicated().values
+        row = self.row[unique]
+        return self._split_by_row(names[keys[unique]], row), self._split_by_row(class_index[keys[unique]], row)
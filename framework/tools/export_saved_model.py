@@ -0,0 +1,12 @@
+import sys
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('python -m framework.tools.export_saved_model <model_name> [model_name ...]')
+        sys.exit()
+    from framework import init
+    from framework.model_manager import model_manager_creator
+    for model_name in sys.argv[1:]:
+        model_manager_creator.instance.export_saved_model(model_name)
+        print('exported:', model_manager_creator.instance.get_model_file(model_name))
@@ -1,37 +1,76 @@
 import sys
+import os
+import numpy as np
 import pandas as pd
+from datetime import datetime
 
 
+def print_progress(title, rows, begin):
+    cost = (datetime.now() - begin).total_seconds()
+    print('%s: %d rows, %.1fs, %.0f rows/sec' % (title, rows, cost, rows / max(cost, 1e-6)))
 
-def get_cluster_info(cluster_info_file, origin_file, dest_file):
-    df_cluster = pd.read_csv(cluster_info_file, chunksize=300, sep='\t')
-    entry_cluster_mapping = {}
-    
-    for records in df_cluster:
-        for i in range(len(records)):
-            row = records.iloc[i]
-            name = row['Cluster name']
-            members = row['Cluster members'].split(';')
-            for member in members: 
-                entry_cluster_mapping[member.strip()] = name.strip()
+def load_cluster_mapping(cluster_info_file, chunk_size=100000):
+    '''build the mapping from cluster members to cluster names of a UniRef cluster file.
+    the mapping is a Series indexed by member with categorical cluster names, when a member appears
+    in several clusters the last one is kept
+    '''
+    begin = datetime.now()
+    all_names = []
+    all_members = []
+    rows = 0
+    for records in pd.read_csv(cluster_info_file, chunksize=chunk_size, sep='\t', usecols=['Cluster name', 'Cluster members']):
+        records = records.dropna()
+        members = records['Cluster members'].str.split(';')
+        all_names.append(records['Cluster name'].str.strip().repeat(members.str.len()).values)
+        all_members.append(members.explode().str.strip().values)
+        rows += len(records)
+        print_progress('cluster file', rows, begin)
 
-    df_data = pd.read_csv(origin_file, chunksize=300, sep='\t')
-    
+    #the cluster names of all chunks are factorized once, instead of merging the categories of every chunk
+    codes, categories = pd.factorize(np.concatenate(all_names) if all_names else np.array([], dtype=object), sort=True)
+    mapping = pd.Series(pd.Categorical.from_codes(codes, categories), index=np.concatenate(all_members) if all_members else [])
+    mapping = mapping[~mapping.index.duplicated(keep='last')]
+    print('cluster members:', len(mapping), 'clusters:', len(categories))
+    return mapping
+
+def get_cluster_mapping(cluster_info_file, mapping_file=None, chunk_size=100000):
+    '''load the mapping from mapping_file when it exists, otherwise build it and save it to mapping_file,
+    so it can be reused for other origin files
+    '''
+    if mapping_file and os.path.exists(mapping_file):
+        print('load cluster mapping:', mapping_file)
+        return pd.read_pickle(mapping_file)
+    mapping = load_cluster_mapping(cluster_info_file, chunk_size)
+    if mapping_file:
+        mapping.to_pickle(mapping_file)
+    return mapping
+
+def get_cluster_info(cluster_info_file, origin_file, dest_file, mapping_file=None, chunk_size=100000):
+    '''append the Cluster name column to the entries of origin_file and write them to dest_file,
+    entries which are not in any cluster get 'unknown'
+    '''
+    mapping = get_cluster_mapping(cluster_info_file, mapping_file, chunk_size)
+    codes = mapping.cat.codes
+    names = np.append(mapping.cat.categories.values.astype(object), 'unknown')
+
+    begin = datetime.now()
+    rows = 0
     need_head = True
-    for records in df_data:
-        temp_list = []
-        for i in range(len(records)):
-            row = records.iloc[i] 
-            try:
-                temp_list.append(entry_cluster_mapping[row['Entry']])
-            except:
-                temp_list.append('unknown')
-        records['Cluster name'] = temp_list
+    for records in pd.read_csv(origin_file, chunksize=chunk_size, sep='\t'):
+        code = records['Entry'].map(codes).fillna(len(names) - 1).astype(np.int64)
+        records['Cluster name'] = names[code.values]
         records.to_csv(dest_file, index=False, mode='a', sep='\t', header=need_head)
         need_head = False
+        rows += len(records)
+        print_progress('origin file', rows, begin)
 
 
 
 if __name__=='__main__':
-    get_cluster_info(sys.argv[1],sys.argv[2],sys.argv[3])
-
+    if len(sys.argv) < 4:
+        print('python extract_cluster_info.py <cluster_info_file> <origin_file> <dest_file> [mapping_file]')
+        sys.exit()
+    mapping_file = None
+    if len(sys.argv) >= 5:
+        mapping_file = sys.argv[4]
+    get_cluster_info(sys.argv[1], sys.argv[2], sys.argv[3], mapping_file)
@@ -0,0 +1,72 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+from datetime import datetime
+
+
+def get_flops(model, length):
+    '''floating point operations of predicting one sequence of length, counted by the tensorflow profiler
+    on the graph of the model
+    '''
+    spec = tf.TensorSpec([1, length], tf.as_dtype(model.inputs[0].dtype))
+    func = tf.function(lambda x:model(x, training=False)).get_concrete_function(spec)
+    options = tf.compat.v1.profiler.ProfileOptionBuilder(tf.compat.v1.profiler.ProfileOptionBuilder.float_operation()).with_empty_output().build()
+    info = tf.compat.v1.profiler.profile(graph=func.graph, run_meta=tf.compat.v1.RunMetadata(), cmd='op', options=options)
+    return info.total_float_ops
+
+def get_latency(model, length, batch_size, repeat=10):
+    '''median seconds of predicting a batch of random sequences of length, after a warm-up call
+    '''
+    x = np.random.randint(1, 21, size=(batch_size, length)).astype(tf.as_dtype(model.inputs[0].dtype).as_numpy_dtype)
+    predict = tf.function(lambda x:model(x, training=False))
+    predict(x)
+    costs = []
+    for _ in range(repeat):
+        begin = datetime.now()
+        np.asarray(tf.nest.flatten(predict(x))[0])
+        costs.append((datetime.now() - begin).total_seconds())
+    return float(np.median(costs))
+
+def get_model_report(model_manager, length=None, batch_sizes=(1, 32), repeat=10):
+    '''params, FLOPs per sequence, receptive field (when the model manager knows it) and latency of the model
+    of model_manager for sequences of length, by default the max_len of the data manager
+    '''
+    model = model_manager.get_model()
+    if length is None:
+        length = model_manager.get_data_manager().get_max_len()
+    ret = {
+        'model':model_manager.name,
+        'length':length,
+        'params':model.count_params(),
+        'flops':get_flops(model, length),
+        'receptive_field':None,
+    }
+    if hasattr(model_manager, 'get_receptive_field'):
+        ret['receptive_field'] = model_manager.get_receptive_field()
+    for batch_size in batch_sizes:
+        ret['latency_ms_batch_%d' % batch_size] = get_latency(model, length, batch_size, repeat) * 1000
+    return ret
+
+def save_report(reports, report_file):
+    '''append reports (list of dict) to a tab separated report file
+    '''
+    df = pd.DataFrame(reports)
+    print(df.to_string(index=False))
+    df.to_csv(report_file, sep='\t', index=False, mode='a', header=not os.path.exists(report_file))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print('python -m framework.tools.model_report <report_file> <model_name> [model_name ...]')
+        sys.exit()
+    from framework import init
+    from framework.model_manager import model_manager_creator
+    reports = []
+    for model_name in sys.argv[2:]:
+        model_manager = model_manager_creator.instance.create_from_file(model_name)
+        report = get_model_report(model_manager)
+        report['model_name'] = model_name
+        reports.append(report)
+    save_report(reports, sys.argv[1])
@@ -0,0 +1,81 @@
+import numpy as np
+from framework.tools import sparse_label
+
+
+class label_counts:
+    '''per class and per row counts of a multi-label prediction against its targets, everything
+    classification_report and strict accuracy need. targets can be dense matrices or sparse_label_set,
+    which are not densified
+    '''
+    def __init__(self, target, pred):
+        pred = np.asarray(pred, dtype=bool)
+        self.row_num, self.class_num = pred.shape
+        if isinstance(target, sparse_label.sparse_label_set):
+            rows = np.repeat(np.arange(len(target)), target.get_lengths())
+            cols = np.asarray(target.indices, dtype=np.int64)
+        else:
+            rows, cols = np.nonzero(np.asarray(target))
+        hit = pred[rows, cols]
+        self.tp = np.bincount(cols[hit], minlength=self.class_num)
+        self.support = np.bincount(cols, minlength=self.class_num)
+        self.pred_count = np.count_nonzero(pred, axis=0)
+        self.row_tp = np.bincount(rows[hit], minlength=self.row_num)
+        self.row_true = np.bincount(rows, minlength=self.row_num)
+        self.row_pred = np.count_nonzero(pred, axis=1)
+
+    def get_strict_accuracy_count(self):
+        '''number of rows whose predicted label set is identical to the target set
+        '''
+        return int(np.count_nonzero((self.row_tp == self.row_true) & (self.row_tp == self.row_pred)))
+
+
+def _divide(a, b):
+    '''a / b, 0 where b is 0, like zero_division=0 of sklearn
+    '''
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    return np.divide(a, b, out=np.zeros(np.broadcast(a, b).shape), where=b != 0)
+
+def _get_scores(tp, pred_count, support):
+    precision = _divide(tp, pred_count)
+    recall = _divide(tp, support)
+    f1 = _divide(2 * tp, pred_count + support)
+    return precision, recall, f1
+
+def get_class_scores(counts):
+    '''per class precision, recall, f1-score and support
+    '''
+    return _get_scores(counts.tp, counts.pred_count, counts.support) + (counts.support,)
+
+def get_average_scores(counts):
+    '''micro, macro, weighted and samples average of precision, recall and f1-score,
+    as the average rows of sklearn classification_report
+    '''
+    precision, recall, f1 = _get_scores(counts.tp, counts.pred_count, counts.support)
+    total = counts.support.sum()
+    ret = [
+        ('micro avg', _get_scores(counts.tp.sum(), counts.pred_count.sum(), total)),
+        ('macro avg', (precision.mean(), recall.mean(), f1.mean())),
+        ('weighted avg', tuple(_divide((e * counts.support).sum(), total) for e in (precision, recall, f1))),
+    ]
+    samples = _get_scores(counts.row_tp, counts.row_pred, counts.row_true)
+    ret.append(('samples avg', tuple(e.mean() for e in samples)))
+    return [(name, tuple(float(e) for e in scores), int(total)) for name, scores in ret]
+
+def classification_report(counts, class_names=None, digits=2):
+    '''text report of per class and average scores, in the layout of sklearn classification_report
+    '''
+    if class_names is None:
+        class_names = [str(i) for i in range(counts.class_num)]
+    precision, recall, f1, support = get_class_scores(counts)
+    averages = get_average_scores(counts)
+    width = max([len(e) for e in class_names] + [len(e[0]) for e in averages] + [digits])
+    head_fmt = '{:>{width}s} ' + ' {:>9}' * 4
+    row_fmt = '{:>{width}s} ' + ' {:>9.{digits}f}' * 3 + ' {:>9}\n'
+    lines = [head_fmt.format('', 'precision', 'recall', 'f1-score', 'support', width=width), '\n\n']
+    for row in zip(class_names, precision, recall, f1, support):
+        lines.append(row_fmt.format(*row, width=width, digits=digits))
+    lines.append('\n')
+    for name, scores, total in averages:
+        lines.append(row_fmt.format(name, *scores, total, width=width, digits=digits))
+    return ''.join(lines)
@@ -0,0 +1,113 @@
+import numpy as np
+from framework import utili
+
+
+class ngram_vocabulary:
+    '''n-gram vocabulary over featureList (e.g. BioDefine.aaList). the id of an n-gram is computed arithmetically:
+    its base-len(featureList) code + 1, 0 is padding, so no n-gram string is built.
+    n-grams with residues which are not in featureList get the OOV id base ** n + 1. models trained before there was
+    an OOV id (has_oov is False) get 0 for them instead.
+    a pruned vocabulary keeps only the n-grams in kept_codes (ids 1..len(kept_codes)) and maps the others to an OOV id
+    '''
+    def __init__(self, featureList, n, kept_codes=None, has_oov=True):
+        self.feature_list = list(featureList)
+        self.n = n
+        self.base = len(self.feature_list)
+        self.has_oov = has_oov
+        self.kept_codes = None
+        self.id_map = None
+        if kept_codes is not None:
+            self.has_oov = True
+            self.kept_codes = np.sort(np.asarray(kept_codes, dtype=np.int64))
+            oov_id = len(self.kept_codes) + 1
+            self.id_map = np.full(self.get_unknown_code() + 1, oov_id, dtype=utili.get_min_dtype(oov_id))
+            self.id_map[0] = 0
+            self.id_map[self.kept_codes] = np.arange(1, oov_id)
+
+    @staticmethod
+    def from_config(featureList, config):
+        '''the vocabulary of a data manager config, config['ngram_vocabulary'] holds the kept codes of a pruned one
+        '''
+        return ngram_vocabulary(featureList, config['ngram'], utili.get_table_value(config, 'ngram_vocabulary'),
+                utili.get_table_value(config, 'ngram_oov', False))
+
+    def get_unknown_code(self):
+        '''the code utili.GetBatchOridinalEncoding gives to n-grams with unknown residues
+        '''
+        return self.base ** self.n + 1
+
+    def is_pruned(self):
+        return self.id_map is not None
+
+    def get_max_features(self):
+        '''the input dim of the embedding: padding, all ids and the OOV id
+        '''
+        if self.is_pruned():
+            return len(self.kept_codes) + 2
+        if self.has_oov:
+            return self.base ** self.n + 2
+        return self.base ** self.n + 1
+
+    def get_oov_id(self):
+        if self.is_pruned():
+            return len(self.kept_codes) + 1
+        if self.has_oov:
+            return self.get_unknown_code()
+        return None
+
+    def map_codes(self, codes):
+        '''map codes of utili.GetBatchOridinalEncoding to the ids of this vocabulary
+        '''
+        if self.is_pruned():
+            return self.id_map[codes]
+        if not self.has_oov:
+            return np.where(codes == self.get_unknown_code(), 0, codes).astype(codes.dtype)
+        return codes
+
+    def encode_codes(self, seqs):
+        '''encode sequences as (codes, offsets) with utili.GetBatchOridinalEncoding, unknown residues do not raise
+        '''
+        return utili.GetBatchOridinalEncoding(seqs, self.feature_list, self.n, self.get_unknown_code())
+
+    def encode(self, seqs):
+        '''encode sequences as (codes, offsets) like utili.GetBatchOridinalEncoding, with the ids of this vocabulary
+        '''
+        codes, offsets = self.encode_codes(seqs)
+        return self.map_codes(codes), offsets
+
+    def count(self, seqs):
+        '''count every n-gram in seqs, the result is indexed by code
+        '''
+        codes, _ = self.encode_codes(seqs)
+        return np.bincount(codes, minlength=self.get_unknown_code() + 1)
+
+    def prune(self, seqs, min_count):
+        '''learn a pruned vocabulary which keeps the n-grams appearing at least min_count times in seqs
+        '''
+        return self.prune_counts(self.count(seqs), min_count)
+
+    def prune_counts(self, counts, min_count):
+        '''learn a pruned vocabulary from n-gram counts indexed by code, e.g. the sum of count over chunks of a file
+        '''
+        counts = counts.copy()
+        counts[0] = 0
+        counts[self.get_unknown_code()] = 0
+        return ngram_vocabulary(self.feature_list, self.n, np.flatnonzero(counts >= min_count))
+
+    def get_ngram(self, ngram_id):
+        '''get the n-gram string of an id, None for padding and OOV
+        '''
+        if self.is_pruned():
+            if ngram_id == 0 or ngram_id > len(self.kept_codes):
+                return None
+            code = self.kept_codes[ngram_id - 1]
+        else:
+            if ngram_id == 0 or ngram_id > self.base ** self.n:
+                return None
+            code = ngram_id
+        code -= 1
+        ret = []
+        for _ in range(self.n):
+            ret.append(self.feature_list[code % self.base])
+            code //= self.base
+        return ''.join(reversed(ret))
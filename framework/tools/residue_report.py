@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+from framework import utili
+from framework.bio import BioDefine
+
+
+class unknown_residue_report:
+    '''collect sequences with residues which are not in featureList during a prediction run.
+    such residues are encoded as the OOV id, the report tells which sequences were affected
+    '''
+    def __init__(self, featureList=BioDefine.aaList):
+        self.table = utili.GetEncodingTable(featureList)
+        self.unknown_index = len(featureList)
+        self.seq_num = 0
+        self.records = []
+
+    def add(self, df):
+        '''count unknown residues of every sequence of df with one table lookup over all residues
+        '''
+        seqs = df['Sequence']
+        self.seq_num += len(seqs)
+        lengths = seqs.str.len().values.astype(np.int64)
+        buf = np.frombuffer(''.join(seqs).encode('ascii', 'replace'), dtype=np.uint8)
+        pos = np.flatnonzero(self.table[buf] == self.unknown_index)
+        if len(pos) == 0:
+            return
+        seq_index = np.searchsorted(np.cumsum(lengths), pos, side='right')
+        pairs = np.unique(seq_index * 256 + buf[pos])
+        rows = np.unique(seq_index)
+        residues = pd.Series(list(map(chr, pairs % 256))).groupby(pairs // 256).agg(''.join)
+        self.records.append(pd.DataFrame({
+            'Entry name':df['Entry name'].values[rows],
+            'unknown residue num':np.bincount(seq_index)[rows],
+            'unknown residues':residues[rows].values,
+        }))
+
+    def get_affected_num(self):
+        return sum(len(e) for e in self.records)
+
+    def save(self, file_name):
+        '''write the affected sequences to file_name
+        '''
+        print('sequences with unknown residues: %d of %d, see %s' % (self.get_affected_num(), self.seq_num, file_name))
+        columns = ['Entry name', 'unknown residue num', 'unknown residues']
+        df = pd.concat(self.records) if self.records else pd.DataFrame(columns=columns)
+        df.to_csv(file_name, sep='\t', index=False)
+
+def get_report_file(output_file):
+    '''the sidecar report file of an output file
+    '''
+    return output_file + '.unknown_residues.tab'
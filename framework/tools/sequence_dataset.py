@@ -0,0 +1,197 @@
+import os
+import sys
+import json
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from framework import utili
+from framework.bio import BioDefine
+from framework.tools import sparse_label
+from framework.tools import ngram_vocabulary
+
+#a dataset directory holds for every split (train, test):
+#   <split>_tokens.npy             flat n-gram ids of all sequences, the smallest unsigned dtype of the vocabulary
+#   <split>_lengths.npy            int32 number of ids of every sequence
+#   <split>_level<i>_indptr.npy    int64 CSR row pointers of the class indices of level i
+#   <split>_level<i>_indices.npy   int32 CSR class indices of level i
+#   <split>_info.pkl               the other columns of the split, e.g. Entry name and Cluster name
+#and metadata.json, which is written last, so a directory without it is incomplete
+metadata_file = 'metadata.json'
+splits = ('train', 'test')
+
+
+class padded_sequence_array:
+    '''a read-only (n, max_len) matrix over flat tokens and their offsets, e.g. memory-mapped ones.
+    rows are padded only when they are indexed, so it can be used where a batch of a padded x matrix is read
+    '''
+    ndim = 2
+
+    def __init__(self, tokens, offsets, max_len, padding='post'):
+        self.tokens = tokens
+        self.offsets = offsets
+        self.max_len = max_len
+        self.padding = padding
+
+    @property
+    def shape(self):
+        return (len(self), self.max_len)
+
+    @property
+    def dtype(self):
+        return self.tokens.dtype
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def get_lengths(self):
+        '''the number of non-padding positions of every row
+        '''
+        return np.minimum(np.diff(self.offsets), self.max_len)
+
+    def take(self, rows):
+        '''pad rows into a (len(rows), max_len) matrix
+        '''
+        codes, offsets = utili.select_batch_encoding(self.tokens, self.offsets, rows)
+        return utili.pad_batch_encoding(np.asarray(codes), offsets, self.max_len, self.padding)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.take(np.arange(*index.indices(len(self))))
+        if np.isscalar(index):
+            if index < 0:
+                index += len(self)
+            return self.take([index])[0]
+        return self.take(index)
+
+
+def _parse_label_column(column):
+    '''parse a column of class index lists saved as text, e.g. '[1, 2]', into per row counts and indices
+    '''
+    items = pd.Series(column.values.astype(str)).str.strip('[] ').str.split(',').explode().str.strip()
+    items = items[items.notna() & (items != '')]
+    return np.bincount(items.index.values, minlength=len(column)), items.values.astype(np.int32)
+
+def _get_path(dest_dir, split, name):
+    return os.path.join(dest_dir, '%s_%s' % (split, name))
+
+def _print_progress(title, rows, begin):
+    cost = (datetime.now() - begin).total_seconds()
+    print('%s: %d rows, %.1fs, %.0f rows/sec' % (title, rows, cost, rows / max(cost, 1e-6)))
+
+def write_dataset(training_file, test_file, config_file, dest_dir, ngram_min_count=None, chunk_size=100000):
+    '''convert the files written by the save_data option of enzyme_data_manager (training set, test set and
+    the config without .pkl) into a dataset directory. the files are read in chunks twice, the first pass gets
+    the sequence lengths (and n-gram counts of the training set when ngram_min_count is set) so the tokens can
+    be written straight into a memory-mapped .npy file by the second pass
+    '''
+    config = utili.load_obj(config_file)
+    level_num = config['level_num']
+    files = {'train':training_file, 'test':test_file}
+    if not os.path.exists(dest_dir):
+        os.makedirs(dest_dir)
+
+    vocabulary = ngram_vocabulary.ngram_vocabulary(BioDefine.aaList, config['ngram'])
+    lengths = {}
+    counts = None
+    for split in splits:
+        begin = datetime.now()
+        split_lengths = []
+        for records in pd.read_csv(files[split], sep='\t', usecols=['Sequence'], chunksize=chunk_size):
+            seqs = records['Sequence'].astype(str)
+            split_lengths.append(np.maximum(seqs.str.len().values - vocabulary.n, 0))
+            if ngram_min_count and split == 'train':
+                chunk_counts = vocabulary.count(seqs)
+                counts = chunk_counts if counts is None else counts + chunk_counts
+            _print_progress('%s lengths' % split, sum(len(e) for e in split_lengths), begin)
+        lengths[split] = np.concatenate(split_lengths).astype(np.int32)
+    if ngram_min_count:
+        vocabulary = vocabulary.prune_counts(counts, ngram_min_count)
+    max_features = vocabulary.get_max_features()
+    dtype = utili.get_min_dtype(max_features - 1)
+    print('max_features:', max_features)
+
+    for split in splits:
+        begin = datetime.now()
+        np.save(_get_path(dest_dir, split, 'lengths.npy'), lengths[split])
+        tokens = np.lib.format.open_memmap(_get_path(dest_dir, split, 'tokens.npy'), mode='w+', dtype=dtype,
+                shape=(int(lengths[split].sum(dtype=np.int64)),))
+        label_counts = [[] for _ in range(level_num)]
+        label_indices = [[] for _ in range(level_num)]
+        infos = []
+        pos = 0
+        rows = 0
+        for records in pd.read_csv(files[split], sep='\t', chunksize=chunk_size):
+            codes, _ = vocabulary.encode(records['Sequence'].astype(str))
+            tokens[pos:pos + len(codes)] = codes
+            pos += len(codes)
+            for i in range(level_num):
+                row_counts, indices = _parse_label_column(records['level%d' % i])
+                label_counts[i].append(row_counts)
+                label_indices[i].append(indices)
+            drop_columns = ['Sequence'] + ['level%d' % i for i in range(level_num + 1)]
+            infos.append(records.drop(columns=[c for c in drop_columns if c in records.columns]))
+            rows += len(records)
+            _print_progress('%s tokens' % split, rows, begin)
+        tokens.flush()
+        del tokens
+
+        for i in range(level_num):
+            indptr = np.zeros(rows + 1, dtype=np.int64)
+            np.cumsum(np.concatenate(label_counts[i]), out=indptr[1:])
+            np.save(_get_path(dest_dir, split, 'level%d_indptr.npy' % i), indptr)
+            np.save(_get_path(dest_dir, split, 'level%d_indices.npy' % i), np.concatenate(label_indices[i]))
+        pd.concat(infos, ignore_index=True).to_pickle(_get_path(dest_dir, split, 'info.pkl'))
+
+    ngram_vocabulary_codes = None
+    if vocabulary.is_pruned():
+        ngram_vocabulary_codes = vocabulary.kept_codes.tolist()
+    metadata = {
+        'level_num':level_num,
+        'label_key':config['label_key'],
+        'ngram':config['ngram'],
+        'ngram_vocabulary':ngram_vocabulary_codes,
+        'ngram_oov':True,
+        'max_features':int(max_features),
+        'max_len':int(config['max_len']),
+        'max_category':[int(e) for e in config['max_category']],
+        'class_maps':[[[k, int(v)] for k, v in config['class_maps'][i].items()] for i in range(level_num)],
+        'using_set_num':int(config['using_set_num']),
+        'rows':{split:len(lengths[split]) for split in splits},
+    }
+    with open(os.path.join(dest_dir, metadata_file), 'w') as f:
+        json.dump(metadata, f)
+    print('dataset written:', dest_dir)
+
+def load_metadata(path):
+    with open(os.path.join(path, metadata_file)) as f:
+        return json.load(f)
+
+def load_split(path, split, metadata):
+    '''load x and the labels of all levels of a split memory-mapped, x is a padded_sequence_array
+    '''
+    tokens = np.load(_get_path(path, split, 'tokens.npy'), mmap_mode='r')
+    lengths = np.load(_get_path(path, split, 'lengths.npy'), mmap_mode='r')
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    x = padded_sequence_array(tokens, offsets, metadata['max_len'])
+    y = []
+    for i in range(metadata['level_num']):
+        indptr = np.load(_get_path(path, split, 'level%d_indptr.npy' % i), mmap_mode='r')
+        indices = np.load(_get_path(path, split, 'level%d_indices.npy' % i), mmap_mode='r')
+        y.append(sparse_label.sparse_label_set(indptr, indices, metadata['max_category'][i]))
+    return x, y
+
+def load_info(path, split):
+    '''the columns of a split other than sequence and labels, e.g. for the cluster batch generator
+    '''
+    return pd.read_pickle(_get_path(path, split, 'info.pkl'))
+
+
+if __name__=='__main__':
+    if len(sys.argv) < 5:
+        print('python -m framework.tools.sequence_dataset <training_file> <test_file> <config_file> <dest_dir> [ngram_min_count]')
+        sys.exit()
+    ngram_min_count = None
+    if len(sys.argv) >= 6:
+        ngram_min_count = int(sys.argv[5])
+    write_dataset(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], ngram_min_count)
@@ -1,83 +1,69 @@
+import inspect
+import tensorflow as tf
 from tensorflow.keras.utils import Sequence
 import numpy as np
-import random
-import copy
+import pandas as pd
+from framework import utili
+
+def get_sequence_kwargs(workers, max_queue_size):
+    '''constructor arguments of a Sequence, keras 3 takes the worker settings there, older keras in fit_generator
+    '''
+    if 'workers' in inspect.signature(Sequence.__init__).parameters:
+        return {'workers':workers, 'max_queue_size':max_queue_size}
+    return {}
+
 class SequenceGenerator(Sequence):
-    def __init__(self, data_manager, batch_size, debug_file = None):
+    '''cluster-balanced batch generator, a batch takes one member per cluster as long as there are enough clusters.
+    clusters are kept as CSR: members of the i-th cluster are cluster_members[cluster_offsets[i]:cluster_offsets[i+1]].
+    workers and max_queue_size are used by keras 3, older keras takes them in fit_generator
+    '''
+    def __init__(self, data_manager, batch_size, debug_file = None, seed = None, workers = 1, max_queue_size = 10):
+        super().__init__(**get_sequence_kwargs(workers, max_queue_size))
         self.data_manager = data_manager
         self.batch_size = batch_size
         x, y = self.data_manager.get_training_data()
-        self.sample_len = None 
-        self.cluster_info = None
-        self.sample_len_store = len(x)
+        self.sample_len = len(x)
         print('sample_len:', self.sample_len)
         self.batch_num = int(np.floor(len(x) / self.batch_size))
-        self.cluster_info_store = {} 
         self.debug_file = debug_file
+        self.random_state = np.random.RandomState(seed)
         training_set, _ = self.data_manager.get_training_and_test_set()
-        print('Cluster name')
-        for i in range(training_set.shape[0]):
-            cluster_name = training_set.iloc[i]['Cluster name']
-            cluster_members = None
-            if not cluster_name in self.cluster_info_store:
-                self.cluster_info_store[cluster_name] = []
-            cluster_members = self.cluster_info_store[cluster_name]
-            cluster_members.append(i)
-        self.cluster_keys = None 
+        cluster_ids, cluster_names = pd.factorize(training_set['Cluster name'])
+        self.cluster_ids = cluster_ids
+        self.cluster_members = np.argsort(cluster_ids, kind='stable')
+        self.cluster_offsets = np.zeros(len(cluster_names) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cluster_ids, minlength=len(cluster_names)), out=self.cluster_offsets[1:])
+        print('cluster num:', len(cluster_names))
+        self.plan = None
         self.reset()
+        if self.debug_file:
+            self.write_debug_file(training_set)
 
     def reset(self):
-        self.sample_len = self.sample_len_store
-        self.cluster_info = copy.deepcopy(self.cluster_info_store)
-        for k in self.cluster_info:
-            random.shuffle(self.cluster_info[k])
-        self.cluster_keys = list(self.cluster_info.keys())
-        random.shuffle(self.cluster_keys)
-        self.cluster_keys = np.array(self.cluster_keys)
+        '''precompute the sample order of an epoch. members are shuffled inside their clusters, round r takes
+        the r-th member of every cluster which has more than r members, and clusters are visited in a random order
+        '''
+        sample_num = len(self.cluster_ids)
+        cluster_num = len(self.cluster_offsets) - 1
+        member_cluster_ids = np.repeat(np.arange(cluster_num), np.diff(self.cluster_offsets))
+        members = self.cluster_members[np.lexsort((self.random_state.random_sample(sample_num), member_cluster_ids))]
+        rank = np.arange(sample_num) - np.repeat(self.cluster_offsets[:-1], np.diff(self.cluster_offsets))
+        cluster_order = self.random_state.permutation(cluster_num)
+        self.plan = members[np.lexsort((cluster_order[member_cluster_ids], rank))]
+
+    def write_debug_file(self, training_set):
+        '''write the samples of the first epoch in batch order, it is done once here instead of in __getitem__,
+        so that batches can be assembled by several workers
+        '''
+        result = self.plan[:self.batch_num * self.batch_size]
+        debug_df = training_set.iloc[result][['Entry', 'Entry name', 'EC number', 'Cluster name']]
+        debug_df.to_csv(self.debug_file, sep='\t', index=False, mode='a')
 
     def __getitem__(self, index):
+        '''only reads the plan of the current epoch, so it is safe to be called from several workers
+        '''
         x, y = self.data_manager.get_training_data()
-        result = []
-        sample_len = self.sample_len
-        needed = min(self.batch_size, sample_len)
-
-        print('get item begin:', sample_len, index, needed, len(self.cluster_keys), len(self.cluster_info))
-
-        need_to_del_keys_index  = []
-
-        if len(self.cluster_keys) >= needed:
-            for i in range(needed):
-                relative_index = (i+(index * self.batch_size))% len(self.cluster_keys)
-                key = self.cluster_keys[relative_index]
-                try:
-                    members = self.cluster_info[key]
-                except:
-                    print('---------bad key:', key)
-                    print(len(self.cluster_keys), len(self.cluster_info), i, len(need_to_del_keys_index))
-                    raise
-                result.append(members.pop()) 
-                sample_len -= 1
-                if len(members) == 0:
-                    need_to_del_keys_index.append(relative_index)
-                    del self.cluster_info[key]
-        else:
-            while needed>len(result):
-                cluster_keys = list(self.cluster_info.keys())
-                random.shuffle(cluster_keys)
-                for k in cluster_keys:
-                    members = self.cluster_info[k]
-                    result.append(members.pop())
-                    if not members:
-                        del self.cluster_info[k]
-                    sample_len -= 1
-                    if needed <= len(result):
-                        break
-        if need_to_del_keys_index:
-            print('need to del')
-            self.cluster_keys = np.delete(self.cluster_keys, need_to_del_keys_index)
-
-        self.sample_len = sample_len
-        training_set, _ = self.data_manager.get_training_and_test_set()
+        result = np.sort(self.plan[index * self.batch_size:(index + 1) * self.batch_size])
         rx = x[result] 
         ry = []
 
@@ -85,16 +71,120 @@ class SequenceGenerator(Sequence):
 
         for i in range(task_num):
             ry.append(y[i][result])
-
-        print('get item end:', index)
-        if self.debug_file:
-            debug_df = training_set.iloc[result][['Entry', 'Entry name', 'EC number', 'Cluster name']]
-            debug_df.to_csv(self.debug_file, sep='\t', index=False, mode='a')
-        return rx, ry
+        return rx, tuple(ry)
 
     def __len__(self):
         return self.batch_num
 
     def on_epoch_end(self):
         self.reset()
-        self.debug_file = None
+
+
+class BatchGenerator(Sequence):
+    '''plain batch generator over x and the task targets, targets can be numpy arrays or sparse_label_set,
+    which are densified per batch
+    '''
+    def __init__(self, x, y, batch_size, indices=None, shuffle=False):
+        super().__init__()
+        self.x = x
+        self.y = y
+        self.batch_size = batch_size
+        if indices is None:
+            indices = np.arange(len(x))
+        self.indices = np.array(indices)
+        self.shuffle = shuffle
+        if self.shuffle:
+            np.random.shuffle(self.indices)
+
+    def __getitem__(self, index):
+        batch_index = np.sort(self.indices[index * self.batch_size:(index + 1) * self.batch_size])
+        return self.x[batch_index], tuple(e[batch_index] for e in self.y)
+
+    def __len__(self):
+        return int(np.ceil(len(self.indices) / self.batch_size))
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            np.random.shuffle(self.indices)
+
+
+class BucketSequenceGenerator(Sequence):
+    '''length-bucketed batch generator, sequences are grouped by length and every batch is only padded
+    to the bound of its bucket. when trim is False, batches keep the full padded width, which is needed
+    by models with fixed input length
+    '''
+    def __init__(self, x, y, batch_size, bucket_bounds=None, trim=True, shuffle=True):
+        super().__init__()
+        self.x = x
+        self.y = y
+        self.batch_size = batch_size
+        self.trim = trim
+        self.shuffle = shuffle
+        self.bucket_bounds = utili.get_bucket_bounds(x.shape[1], bucket_bounds)
+        lengths = utili.get_padded_lengths(x)
+        bucket_ids = np.searchsorted(self.bucket_bounds, lengths, side='left')
+        self.buckets = [np.flatnonzero(bucket_ids == i) for i in range(len(self.bucket_bounds))]
+        self.batches = None
+        self.reset()
+
+    def reset(self):
+        batches = []
+        for bucket_id, members in enumerate(self.buckets):
+            if self.shuffle:
+                members = np.random.permutation(members)
+            for begin in range(0, len(members), self.batch_size):
+                batches.append((bucket_id, np.sort(members[begin:begin + self.batch_size])))
+        if self.shuffle:
+            batches = [batches[i] for i in np.random.permutation(len(batches))]
+        self.batches = batches
+
+    def get_batch(self, bucket_id, batch_index):
+        rx = self.x[batch_index]
+        if self.trim:
+            rx = utili.trim_padding(rx, self.bucket_bounds[bucket_id])
+        return rx, tuple(e[batch_index] for e in self.y)
+
+    def __getitem__(self, index):
+        bucket_id, batch_index = self.batches[index]
+        return self.get_batch(bucket_id, batch_index)
+
+    def __len__(self):
+        return len(self.batches)
+
+    def on_epoch_end(self):
+        self.reset()
+
+    def to_dataset(self, workers=1):
+        '''tf.data.Dataset over the batches of an epoch, with a variable batch width. keras 3 fixes the input shape
+        of a Sequence from the first batches it sees, so batches trimmed to different bucket bounds have to be fed
+        as a dataset whose signature leaves the width open. the batches are reshuffled after every epoch and
+        gathered by workers parallel calls in their order
+        '''
+        def generate():
+            #every element carries its rows, so reshuffling at the end of an epoch does not change batches
+            #which are still being gathered
+            for bucket_id, batch_index in self.batches:
+                yield batch_index, bucket_id
+            self.on_epoch_end()
+
+        x, y = self[0]
+        x_shape = (None,) * x.ndim if self.trim else (None,) + x.shape[1:]
+        dtypes = [tf.as_dtype(x.dtype)] + [tf.as_dtype(e.dtype) for e in y]
+        shapes = [tf.TensorShape(x_shape)] + [tf.TensorShape((None,) + e.shape[1:]) for e in y]
+
+        def gather(batch_index, bucket_id):
+            rx, ry = self.get_batch(bucket_id, batch_index)
+            return [rx] + list(ry)
+
+        def gather_batch(batch_index, bucket_id):
+            batch = tf.numpy_function(gather, [batch_index, bucket_id], dtypes)
+            for e, shape in zip(batch, shapes):
+                e.set_shape(shape)
+            return batch[0], tuple(batch[1:])
+
+        if 'output_signature' in inspect.signature(tf.data.Dataset.from_generator).parameters:
+            signature = (tf.TensorSpec((None,), tf.int64), tf.TensorSpec((), tf.int64))
+            dataset = tf.data.Dataset.from_generator(generate, output_signature=signature)
+        else:
+            dataset = tf.data.Dataset.from_generator(generate, output_types=(tf.int64, tf.int64), output_shapes=((None,), ()))
+        return dataset.map(gather_batch, num_parallel_calls=workers)
@@ -0,0 +1,127 @@
+import numpy as np
+from itertools import chain
+
+
+class sparse_label_set:
+    '''multi-label targets kept as CSR index lists (indptr + indices).
+    rows are densified to float32 only when they are indexed, e.g. when a batch is fed to the model
+    '''
+    def __init__(self, indptr, indices, num_classes):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices)
+        self.num_classes = num_classes
+
+    @staticmethod
+    def from_label_lists(label_lists, num_classes):
+        '''build from a column of label index lists, e.g. the level%d columns of the data manager
+        '''
+        label_lists = list(label_lists)
+        lengths = np.fromiter((len(e) for e in label_lists), dtype=np.int64, count=len(label_lists))
+        indptr = np.zeros(len(label_lists) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        indices = np.fromiter(chain.from_iterable(label_lists), dtype=np.int32, count=indptr[-1])
+        return sparse_label_set(indptr, indices, num_classes)
+
+    @property
+    def shape(self):
+        return (len(self), self.num_classes)
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def get_lengths(self):
+        return np.diff(self.indptr)
+
+    def _gather(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        lengths = self.indptr[rows + 1] - self.indptr[rows]
+        row_offsets = np.cumsum(lengths) - lengths
+        positions = np.repeat(self.indptr[rows] - row_offsets, lengths) + np.arange(lengths.sum())
+        return rows, lengths, self.indices[positions]
+
+    def take(self, rows):
+        '''select rows, the result is still a sparse_label_set
+        '''
+        rows, lengths, indices = self._gather(rows)
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        return sparse_label_set(indptr, indices, self.num_classes)
+
+    def to_dense(self, rows=None, dtype=np.float32):
+        if rows is None:
+            rows = np.arange(len(self))
+        rows, lengths, indices = self._gather(rows)
+        ret = np.zeros((len(rows), self.num_classes), dtype=dtype)
+        ret[np.repeat(np.arange(len(rows)), lengths), indices] = 1
+        return ret
+
+    def to_dense_columns(self, begin, end, dtype=np.float32):
+        '''densify the columns begin:end of all rows
+        '''
+        indices = np.asarray(self.indices)
+        in_columns = (indices >= begin) & (indices < end)
+        rows = np.repeat(np.arange(len(self)), self.get_lengths())[in_columns]
+        ret = np.zeros((len(self), end - begin), dtype=dtype)
+        ret[rows, indices[in_columns] - begin] = 1
+        return ret
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.to_dense(np.arange(len(self))[index])
+        if np.isscalar(index):
+            if index < 0:
+                index += len(self)
+            return self.to_dense([index])[0]
+        return self.to_dense(index)
+
+
+def is_sparse(y):
+    '''check whether any of the task targets is a sparse_label_set
+    '''
+    if isinstance(y, (list, tuple)):
+        return any(isinstance(e, sparse_label_set) for e in y)
+    return isinstance(y, sparse_label_set)
+
+
+def take_rows(y, rows):
+    '''select rows of a task target, a sparse_label_set stays sparse
+    '''
+    if isinstance(y, sparse_label_set):
+        return y.take(rows)
+    return y[rows]
+
+
+def to_dense(y):
+    '''densify a task target if it is a sparse_label_set, other targets are returned unchanged
+    '''
+    if isinstance(y, sparse_label_set):
+        return y.to_dense()
+    return y
+
+
+def decode_label_lists(pred, class_names):
+    '''class names of the true cells of every row of a boolean prediction matrix, as lists
+    '''
+    rows, cols = np.nonzero(pred)
+    names = np.asarray(class_names, dtype=object)[cols].tolist()
+    counts = np.bincount(rows, minlength=len(pred))
+    ends = np.cumsum(counts)
+    begins = ends - counts
+    return [names[b:e] for b, e in zip(begins.tolist(), ends.tolist())]
+
+
+def decode_label_strings(pred, class_names, sep=';'):
+    '''class names of the true cells of every row of a boolean prediction matrix, joined by sep.
+    the cells are found by np.nonzero and the names of a row are joined by a segment sum (np.add.reduceat)
+    of the object array, rows without a true cell are empty strings
+    '''
+    rows, cols = np.nonzero(pred)
+    ret = np.full(len(pred), '', dtype=object)
+    if len(rows) == 0:
+        return ret
+    is_begin = np.ones(len(rows), dtype=bool)
+    is_begin[1:] = rows[1:] != rows[:-1]
+    names = np.where(is_begin, '', sep).astype(object) + np.asarray(class_names, dtype=object)[cols]
+    begins = np.flatnonzero(is_begin)
+    ret[rows[begins]] = np.add.reduceat(names, begins)
+    return ret
@@ -0,0 +1,125 @@
+import numpy as np
+from framework.tools import sparse_label
+
+
+def _get_column_thresholds(scores, target, beta, default):
+    '''the threshold of every column which maximizes its F-beta score, found by one sweep over the sorted scores
+    of the column: predicting the k highest scores gives tp = cumsum of the sorted targets, so the F-beta score of
+    every cut point is computed at once. the threshold is the middle of the two scores around the best cut point,
+    columns without positive examples get default
+    '''
+    n = scores.shape[0]
+    if not np.issubdtype(scores.dtype, np.floating):
+        scores = scores.astype(np.float32)
+    order = np.argsort(-scores, axis=0, kind='stable')
+    sorted_scores = np.take_along_axis(scores, order, axis=0)
+    tp = np.cumsum(np.take_along_axis(target, order, axis=0), axis=0, dtype=np.float64)
+    positive = tp[-1]
+    beta2 = beta * beta
+    f = (1 + beta2) * tp / (beta2 * positive + np.arange(1, n + 1)[:, None])
+    next_scores = np.empty_like(sorted_scores)
+    next_scores[:-1] = sorted_scores[1:]
+    next_scores[-1] = np.nextafter(sorted_scores[-1], sorted_scores.dtype.type(-np.inf))
+    #a cut point between tied scores can not be a threshold
+    f[sorted_scores <= next_scores] = -1
+    best = np.argmax(f, axis=0)
+    cols = np.arange(scores.shape[1])
+    ret = _get_threshold_between(sorted_scores[best, cols], next_scores[best, cols], best == n - 1)
+    ret[(positive == 0) | (f[best, cols] <= 0)] = default
+    return ret
+
+def _get_threshold_between(upper, lower, is_last):
+    '''a threshold which keeps upper and drops lower, the middle of them. the middle is computed in the dtype of
+    the scores, it can round to upper when they are adjacent numbers, then lower is used. when upper is the lowest
+    score, lower is the next representable number below it
+    '''
+    ret = lower + (upper - lower) / 2
+    return np.where(is_last | (ret >= upper), lower, ret)
+
+def _get_column_blocks(scores, block_size):
+    n, class_num = scores.shape
+    step = max(1, block_size // max(n, 1))
+    return [(begin, min(begin + step, class_num)) for begin in range(0, class_num, step)]
+
+def _get_target_columns(target, begin, end):
+    '''dense columns begin:end of a task target, a sparse_label_set is only densified for these columns
+    '''
+    if isinstance(target, sparse_label.sparse_label_set):
+        return target.to_dense_columns(begin, end)
+    return np.asarray(target[:, begin:end])
+
+def _get_positive_scores(scores, target, block_size):
+    if isinstance(target, sparse_label.sparse_label_set):
+        rows = np.repeat(np.arange(len(target)), target.get_lengths())
+        return scores[rows, np.asarray(target.indices, dtype=np.int64)]
+    ret = []
+    for begin, end in _get_column_blocks(scores, block_size):
+        rows, cols = np.nonzero(_get_target_columns(target, begin, end))
+        ret.append(scores[rows, cols + begin])
+    return np.concatenate(ret)
+
+def get_class_thresholds(scores, target, beta=1.0, default=0.5, block_size=10000000):
+    '''per class thresholds of a task, classes are swept in blocks of about block_size scores, and only the
+    target columns of a block are densified
+    '''
+    scores = np.asarray(scores)
+    ret = []
+    for begin, end in _get_column_blocks(scores, block_size):
+        ret.append(_get_column_thresholds(scores[:, begin:end], _get_target_columns(target, begin, end), beta, default))
+    return np.concatenate(ret)
+
+def get_level_threshold(scores, target, beta=1.0, default=0.5, block_size=10000000):
+    '''one threshold for all classes of a task, which maximizes the micro F-beta score. the best cut point
+    always keeps a positive score as its lowest one, so only the distinct positive scores are candidates:
+    tp of a candidate is counted on the positive scores, and the number of predictions on the sorted scores of
+    every block of classes, so neither the full target nor a sort of all scores is needed
+    '''
+    scores = np.asarray(scores)
+    if not np.issubdtype(scores.dtype, np.floating):
+        scores = scores.astype(np.float32)
+    positive_scores = np.sort(_get_positive_scores(scores, target, block_size))
+    if len(positive_scores) == 0:
+        return scores.dtype.type(default)
+    candidates = np.unique(positive_scores)
+    tp = len(positive_scores) - np.searchsorted(positive_scores, candidates, side='left')
+    pred_count = np.zeros(len(candidates), dtype=np.int64)
+    lower = np.full(len(candidates), -np.inf, dtype=scores.dtype)
+    for begin, end in _get_column_blocks(scores, block_size):
+        block = np.sort(scores[:, begin:end], axis=None)
+        index = np.searchsorted(block, candidates, side='left')
+        pred_count += len(block) - index
+        #the highest score below every candidate, the cut point is between it and the candidate
+        has_lower = index > 0
+        lower[has_lower] = np.maximum(lower[has_lower], block[index[has_lower] - 1])
+    beta2 = beta * beta
+    f = (1 + beta2) * tp / (beta2 * len(positive_scores) + pred_count)
+    #the highest threshold among equal scores, as the sweep of get_class_thresholds
+    best = len(candidates) - 1 - np.argmax(f[::-1])
+    is_last = np.isneginf(lower[best])
+    if is_last:
+        lower[best] = np.nextafter(candidates[best], scores.dtype.type(-np.inf))
+    return _get_threshold_between(candidates[best], lower[best], is_last)[()]
+
+def get_thresholds(y_pred, y_true, mode='class', beta=1.0, default=0.5):
+    '''thresholds of every task, tuned on held-out predictions. mode is 'class' for a threshold vector per task
+    or 'level' for one threshold per task
+    '''
+    if not isinstance(y_pred, list):
+        y_pred = [y_pred]
+    ret = []
+    for scores, target in zip(y_pred, y_true):
+        if mode == 'class':
+            ret.append(get_class_thresholds(scores, target, beta, default))
+        elif mode == 'level':
+            ret.append(get_level_threshold(scores, target, beta, default))
+        else:
+            raise Exception('unknown threshold tuning mode: %s' % mode)
+    return ret
+
+def apply_thresholds(y_pred, thresholds):
+    '''boolean predictions of every task, scores are compared with a threshold or a per class threshold vector
+    '''
+    ret = []
+    for scores, threshold in zip(y_pred, thresholds):
+        ret.append(scores > threshold)
+    return ret
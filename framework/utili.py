@@ -1,10 +1,13 @@
 import numpy as np
 import pickle
+import itertools
 
 n_gram_map = {}
 
 ordinal_map = {}
 
+encoding_table_map = {}
+
 debug = True 
 
 basic_info_cnt = 0
@@ -14,32 +17,178 @@ def set_debug_flag(flag):
 
 def GetOridinalEncoding(seq, featureList, n):
     aaHash = None 
-    featurelist_hash_str = '_'.join(featureList)
-    if not featurelist_hash_str in ordinal_map:
-        aaHash = {}
-        for index, aa in enumerate(featureList):
-        	aaHash[aa] = index + 1
-        ordinal_map[featurelist_hash_str] = aaHash
+    #the same list object is passed on every call of a batch, so it is looked up by identity before its joined key
+    if ordinal_map.get('last_feature_list') is featureList:
+        aaHash = ordinal_map['last_hash']
     else:
-        aaHash = ordinal_map[featurelist_hash_str]
+        featurelist_hash_str = '_'.join(featureList)
+        if not featurelist_hash_str in ordinal_map:
+            aaHash = {}
+            for index, aa in enumerate(featureList):
+            	aaHash[aa] = index + 1
+            ordinal_map[featurelist_hash_str] = aaHash
+        else:
+            aaHash = ordinal_map[featurelist_hash_str]
+        ordinal_map['last_feature_list'] = featureList
+        ordinal_map['last_hash'] = aaHash
     ret = []
     for l in range(len(seq)-n):
     	ret.append(aaHash[seq[l:l+n]])
     
     return np.asarray(ret)
 
+def get_min_dtype(max_value):
+    '''get the smallest unsigned integer type which can hold max_value
+    '''
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+    return np.uint64
+
+def GetEncodingTable(featureList):
+    '''get a 256-entry byte lookup table, which maps a residue to its position in featureList.
+    bytes which are not in featureList are mapped to len(featureList)
+    '''
+    featurelist_hash_str = '_'.join(featureList)
+    if not featurelist_hash_str in encoding_table_map:
+        table = np.full(256, len(featureList), dtype=get_min_dtype(len(featureList)))
+        for index, aa in enumerate(featureList):
+            table[ord(aa)] = index
+        encoding_table_map[featurelist_hash_str] = table
+    return encoding_table_map[featurelist_hash_str]
+
+def GetBatchOridinalEncoding(seqs, featureList, n, unknown_code=None):
+    '''encode a batch of sequences in one shot. featureList is the residue list (e.g. BioDefine.aaList),
+    the indices are identical to GetOridinalEncoding(seq, GetNGrams(featureList, n), n).
+    n-grams with a residue which is not in featureList get unknown_code, or KeyError is raised when it is None.
+    return (codes, offsets), the codes of the i-th sequence are codes[offsets[i]:offsets[i+1]]
+    '''
+    seqs = list(seqs)
+    base = len(featureList)
+    dtype = get_min_dtype(max(base ** n, unknown_code or 0))
+    lengths = np.fromiter((len(seq) for seq in seqs), dtype=np.int64, count=len(seqs))
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    code_lengths = np.maximum(lengths - n, 0)
+    offsets = np.zeros(len(seqs) + 1, dtype=np.int64)
+    np.cumsum(code_lengths, out=offsets[1:])
+
+    buf = np.frombuffer(''.join(seqs).encode('ascii', 'replace'), dtype=np.uint8)
+    window_num = len(buf) - n + 1
+    if window_num <= 0:
+        return np.zeros(0, dtype=dtype), offsets
+
+    residues = GetEncodingTable(featureList)[buf]
+    codes = residues[:window_num].astype(dtype)
+    unknown = residues[:window_num] == base
+    for k in range(1, n):
+        codes *= base
+        codes += residues[k:window_num + k]
+        unknown |= residues[k:window_num + k] == base
+    codes += 1
+
+    #like GetOridinalEncoding, the last n windows of every sequence are not encoded
+    mask = np.ones(len(buf), dtype=bool)
+    for k in range(1, n + 1):
+        mask[(ends - k)[ends - k >= starts]] = False
+    mask = mask[:window_num]
+
+    if unknown_code is not None:
+        codes[unknown] = unknown_code
+    elif unknown[mask].any():
+        pos = np.flatnonzero(unknown & mask)[0]
+        seq_index = np.searchsorted(ends, pos, side='right')
+        begin = pos - starts[seq_index]
+        raise KeyError(seqs[seq_index][begin:begin + n])
+    return codes[mask], offsets
+
+def split_batch_encoding(codes, offsets):
+    '''split the result of GetBatchOridinalEncoding into one array per sequence
+    '''
+    return np.split(codes, offsets[1:-1])
+
+def select_batch_encoding(codes, offsets, rows):
+    '''select the sequences of rows from the result of GetBatchOridinalEncoding
+    '''
+    rows = np.asarray(rows, dtype=np.int64)
+    lengths = offsets[rows + 1] - offsets[rows]
+    ret_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=ret_offsets[1:])
+    positions = np.repeat(offsets[rows] - ret_offsets[:-1], lengths) + np.arange(ret_offsets[-1])
+    return codes[positions], ret_offsets
+
+def pad_batch_encoding(codes, offsets, max_len, padding='post', block_size=65536):
+    '''write the result of GetBatchOridinalEncoding straight into a preallocated (n, max_len) matrix,
+    like pad_sequences, padding is 'post' or 'pre' and sequences longer than max_len are truncated at the beginning.
+    the matrix keeps the dtype of codes, which is the smallest one can hold all the indices
+    '''
+    seq_num = len(offsets) - 1
+    ret = np.zeros((seq_num, max_len), dtype=codes.dtype)
+    lengths = np.diff(offsets)
+    kept = np.minimum(lengths, max_len)
+    positions = np.arange(max_len)
+    for begin in range(0, seq_num, block_size):
+        end = min(begin + block_size, seq_num)
+        block_codes = codes[offsets[begin]:offsets[end]]
+        dropped = np.flatnonzero(lengths[begin:end] > max_len)
+        if len(dropped):
+            drop_begin = offsets[begin:end][dropped] - offsets[begin]
+            delta = np.zeros(len(block_codes) + 1, dtype=np.int8)
+            delta[drop_begin] += 1
+            delta[drop_begin + (lengths - kept)[begin:end][dropped]] -= 1
+            block_codes = block_codes[np.cumsum(delta[:-1], dtype=np.int8) == 0]
+        if padding == 'post':
+            mask = positions < kept[begin:end, None]
+        else:
+            mask = positions >= (max_len - kept[begin:end])[:, None]
+        np.place(ret[begin:end], mask, block_codes)
+    return ret
+
+def get_padded_lengths(x, block_size=65536):
+    '''get the number of non-padding positions of every row of a padded matrix
+    '''
+    if hasattr(x, 'get_lengths'):
+        #e.g. sequence_dataset.padded_sequence_array knows its lengths without padding rows
+        return x.get_lengths()
+    ret = np.zeros(len(x), dtype=np.int64)
+    for begin in range(0, len(x), block_size):
+        ret[begin:begin + block_size] = np.count_nonzero(np.asarray(x[begin:begin + block_size]), axis=1)
+    return ret
+
+def trim_padding(x, length):
+    '''trim a padded matrix to length columns, the padding side is detected from its first and last columns
+    '''
+    if length >= x.shape[1]:
+        return x
+    if np.count_nonzero(x[:, 0]) >= np.count_nonzero(x[:, -1]):
+        return x[:, :length]
+    return x[:, x.shape[1] - length:]
+
+def get_bucket_bounds(max_len, bucket_bounds=None):
+    '''get sorted bucket bounds which end with max_len, by default the bounds grow by 1.5 times from 64
+    '''
+    if not bucket_bounds:
+        bucket_bounds = []
+        bound = 64
+        while bound < max_len:
+            bucket_bounds.append(bound)
+            bound = int(bound * 1.5)
+    bucket_bounds = sorted(b for b in bucket_bounds if b < max_len)
+    return np.array(bucket_bounds + [max_len], dtype=np.int64)
+
+def GetPaddedOridinalEncoding(seqs, featureList, n, max_len, padding='post'):
+    '''encode a batch of sequences into a padded (n, max_len) matrix without intermediate per-sequence arrays
+    '''
+    codes, offsets = GetBatchOridinalEncoding(seqs, featureList, n)
+    return pad_batch_encoding(codes, offsets, max_len, padding)
+
 def GetOneHotEncoding(seq, featureList, max_len):
-    aaHash = {}
-    for index, aa in enumerate(featureList):
-    	aaHash[aa] = index
-    temp = []
+    '''one-hot encoding of a sequence, positions of residues which are not in featureList are all zero
+    '''
     ret = np.zeros((max_len, len(featureList)))
-    for pos, l in enumerate(seq):
-        try:
-            index = aaHash[l]
-        except:
-        	print('\nseq:', seq, "\nletter:", l)
-        ret[pos][index] = 1.0
+    index = GetEncodingTable(featureList)[np.frombuffer(seq.encode('ascii', 'replace'), dtype=np.uint8)].astype(np.int64)
+    pos = np.flatnonzero(index < len(featureList))
+    ret[pos, index[pos]] = 1.0
     return ret
 
 
@@ -47,32 +196,13 @@ def explode(res, joined, groups):
     for i in range(len(groups) + 1):
         res.append(groups[:i] + joined + groups[i:])
 
-def _GetInnerGrams(result, featureList, n, cur_pos=0, indicators=None):
-    if indicators is None:
-        indicators = [0] * n
-    
-    if cur_pos == n-1: 
-        temp = []
-        for i in range(len(indicators)-1):
-            temp.append(featureList[indicators[i]])
-
-        for j in range(len(featureList)):
-            temp2 = temp.copy()
-            temp2.append(featureList[j])
-            result.append(''.join(temp2))
-    else:
-        for i in range(len(featureList)):
-            indicators[cur_pos] = i
-            _GetInnerGrams(result, featureList, n, cur_pos + 1, indicators)
-    return result 
-    
-
 def GetNGrams(featureList, n):
+    '''get all n-grams of featureList, ordered by their base-len(featureList) code.
+    only needed by the per-sequence GetOridinalEncoding, ngram_vocabulary computes ids without the strings
+    '''
     feature_hash = '%s%d' % ('_'.join(featureList), n)
     if not feature_hash in n_gram_map:
-        result = []
-        result = _GetInnerGrams(result, featureList, n)
-        n_gram_map[feature_hash] = result
+        n_gram_map[feature_hash] = [''.join(e) for e in itertools.product(featureList, repeat=n)]
     return n_gram_map[feature_hash]
 
 def GetNGramEncoding(seq, featureList, n, max_len):
@@ -114,11 +244,11 @@ def strict_identical_compare(L1, L2):
     return bool(v.all())
     
 def strict_compare_report(label_set1, label_set2, length):
-    res = 0
-    for i in range(length):
-        if strict_identical_compare(label_set1[i], label_set2[i]):
-            res += 1
-    return res
+    '''number of the first length rows which are identical in both label matrices
+    '''
+    label_set1 = np.asarray(label_set1[:length])
+    label_set2 = np.asarray(label_set2[:length])
+    return int(np.count_nonzero((label_set1 == label_set2).reshape(length, -1).all(axis=1)))
 
 def get_table_value(table, key, default=None):
     ret = None
@@ -1,38 +1,91 @@
 import enzyme_classifier
 import enzyme_protein_classifier
+from framework.model_manager import model_manager_creator
+from framework import utili
+from framework.tools import residue_report
 from datetime import datetime
+import numpy as np
 import pandas as pd
 import sys, getopt
-import os
 
-def run(input_file, output_file,is_enzyme_model, enzyme_model):
-    temp_output_1 = '__temp1__.csv'
-    temp_output_2 = '__temp2__.csv'
-    temp_output_3 = '__temp3__.csv'
-    enzyme_protein_classifier.run(input_file, temp_output_1, is_enzyme_model) 
-    intermedia_cp = pd.read_csv(temp_output_1, sep='\t')
-    intermedia_cc = intermedia_cp[intermedia_cp['is enzyme'].apply(lambda x:x.strip()=='Y')]
-    input_df = pd.read_csv(input_file, sep='\t')
-    intermedia_cc = pd.concat([intermedia_cc, input_df], axis=1, join='inner')
-    intermedia_cc.to_csv(temp_output_2, sep='\t')
-    enzyme_classifier.run(temp_output_2, temp_output_3, enzyme_model)
-    intermedia_cc = pd.read_csv(temp_output_3, sep='\t')
-    final_result = pd.merge(intermedia_cp, intermedia_cc, how='left', on='Entry name')
-    final_result.to_csv(output_file, sep='\t')
-    os.remove(temp_output_1)
-    os.remove(temp_output_2)
-    os.remove(temp_output_3)
+def encode(data_manager, df, rows, encoding_cache):
+    '''get data used for prediction of rows in df, the encoding of a chunk is shared by models with the same ngram
+    '''
+    ngram = data_manager.get_encode_info()['ngram']
+    if not ngram in encoding_cache:
+        encoding_cache[ngram] = data_manager.get_vocabulary().encode_codes(df['Sequence'])
+    codes, offsets = encoding_cache[ngram]
+    return data_manager.get_x_from_encoding(*utili.select_batch_encoding(codes, offsets, rows))
+
+def predict(is_enzyme_mc, enzyme_mc, df, hierarchical=False, report=None):
+    '''predict a chunk of input: sequences are encoded once, the E_P model runs on all of them,
+    and only the ones predicted as enzyme are routed to the E_C model. the predicted sequences with unknown
+    residues are added to report when it is given
+    '''
+    is_enzyme_dm = is_enzyme_mc.get_data_manager()
+    enzyme_dm = enzyme_mc.get_data_manager()
+    df = df.reset_index(drop=True)
+    lengths = df['Sequence'].str.len().values
+    encoding_cache = {}
+
+    is_enzyme_rows = np.flatnonzero(lengths < is_enzyme_dm.get_max_len())
+    if report is not None:
+        report.add(df.iloc[is_enzyme_rows])
+    task_columns = ['task %d' % i for i in range(enzyme_dm.get_task_num())]
+    if len(is_enzyme_rows) == 0:
+        #no sequence of the chunk fits the E_P model, neither model is run
+        return pd.DataFrame(columns=['Entry name', 'is enzyme'] + task_columns)
+    x = encode(is_enzyme_dm, df, is_enzyme_rows, encoding_cache)
+    result = enzyme_protein_classifier.get_result(is_enzyme_dm, is_enzyme_mc.predict(x), df['Entry name'].iloc[is_enzyme_rows])
+
+    is_enzyme = result['is enzyme'].str.strip().values == 'Y'
+    enzyme_rows = is_enzyme_rows[is_enzyme & (lengths[is_enzyme_rows] < enzyme_dm.get_max_len())]
+    if len(enzyme_rows) > 0:
+        x = encode(enzyme_dm, df, enzyme_rows, encoding_cache)
+        enzyme_result = enzyme_classifier.get_result(enzyme_dm, enzyme_mc.predict(x), df['Entry name'].iloc[enzyme_rows], hierarchical)
+        enzyme_result.index = np.searchsorted(is_enzyme_rows, enzyme_rows)
+        result = pd.concat([result, enzyme_result[task_columns]], axis=1)
+    else:
+        result = result.reindex(columns=list(result.columns) + task_columns)
+    return result
+
+def run(input_file, output_file, is_enzyme_model, enzyme_model, chunk_size=None, hierarchical=False):
+    '''run the E_P model and then the E_C model on predicted enzymes in one process without temporary files.
+    when chunk_size is given, the input file is read, predicted and written chunk by chunk
+    '''
+    is_enzyme_mc = model_manager_creator.instance.create_from_file(is_enzyme_model)
+    enzyme_mc = model_manager_creator.instance.create_from_file(enzyme_model)
+    if chunk_size:
+        chunks = pd.read_csv(input_file, sep='\t', chunksize=chunk_size)
+    else:
+        chunks = [pd.read_csv(input_file, sep='\t')]
+
+    report = residue_report.unknown_residue_report()
+    begin = datetime.now()
+    need_head = True
+    seq_num = 0
+    for df in chunks:
+        result = predict(is_enzyme_mc, enzyme_mc, df, hierarchical, report)
+        result.index = np.arange(seq_num, seq_num + result.shape[0])
+        result.to_csv(output_file, sep='\t', mode='w' if need_head else 'a', header=need_head)
+        need_head = False
+        seq_num += result.shape[0]
+    cost = (datetime.now() - begin).total_seconds()
+    print('predicted %d sequences in %f seconds, %f sequences/sec' % (seq_num, cost, seq_num / max(cost, 1e-6)))
+    report.save(residue_report.get_report_file(output_file))
 
 def command_line_parser(argv):
     name = argv[0]
     argv = argv[1:]
-    help_str = '%s -i <input_file> -o <output_file> -d <distinguishmodel> -e <enzymemodel>' % name
+    help_str = '%s -i <input_file> -o <output_file> -d <distinguishmodel> -e <enzymemodel> [-c <chunk_size>] [-H]' % name
     input_file = '' 
     output_file= '' 
     is_enzyme_model = '' 
     enzyme_model = ''
+    chunk_size = None
+    hierarchical = False
     try:
-        opts, args = getopt.getopt(argv,"hi:o:d:e:",["ifile", "ofile=", "distinguishmodel=", "enzymemodel="])
+        opts, args = getopt.getopt(argv,"hi:o:d:e:c:H",["ifile", "ofile=", "distinguishmodel=", "enzymemodel=", "chunksize=", "hierarchical"])
     except getopt.GetoptError:
         print(help_str) 
         sys.exit(2)
@@ -48,15 +101,19 @@ def command_line_parser(argv):
             enzyme_model = arg
         elif opt in ('-d', '--distinguishmodel'):
             is_enzyme_model = arg
+        elif opt in ('-c', '--chunksize'):
+            chunk_size = int(arg)
+        elif opt in ('-H', '--hierarchical'):
+            hierarchical = True
 
     if not input_file or not output_file or not enzyme_model or not is_enzyme_model:
         print(help_str)
         sys.exit()
-    return input_file, output_file, is_enzyme_model, enzyme_model
+    return input_file, output_file, is_enzyme_model, enzyme_model, chunk_size, hierarchical
 
 def main(argv):
-    input_file, output_file, is_enzyme_model, enzyme_model = command_line_parser(argv)
-    run(input_file, output_file, is_enzyme_model, enzyme_model)
+    input_file, output_file, is_enzyme_model, enzyme_model, chunk_size, hierarchical = command_line_parser(argv)
+    run(input_file, output_file, is_enzyme_model, enzyme_model, chunk_size, hierarchical)
 
 if __name__ == "__main__":
    begin = datetime.now()
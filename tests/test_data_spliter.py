@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+from framework.tools import data_spliter
+
+
+def get_data(row_num, class_num, seed=0):
+    random_state = np.random.RandomState(seed)
+    labels = [[int(e)] for e in random_state.randint(0, class_num, row_num)]
+    for i in range(class_num):
+        labels[i] = [i]
+    return pd.DataFrame({'label':labels, 'group':np.arange(row_num) // 4})
+
+
+def test_training_size_excludes_forced_test_rows():
+    df = get_data(100, 5)
+    training_set, test_set = data_spliter.split_data(df, 0.7, 'label', seed=1)
+    #int(100 * 0.7) minus the 5 rows holding the first example of every class
+    assert training_set.shape[0] == 65
+    assert test_set.shape[0] == 35
+    assert sorted(training_set.index.tolist() + test_set.index.tolist()) == list(range(100))
+    assert set(sum(test_set['label'].tolist(), [])) == set(range(5))
+
+
+def test_training_size_with_groups():
+    df = get_data(100, 5)
+    training_set, test_set = data_spliter.split_data(df, 0.7, 'label', group_name='group', seed=1)
+    #the first 5 rows fall in groups 0 and 1, their 8 rows are forced into the test set
+    assert training_set.shape[0] == 60
+    assert test_set.shape[0] == 40
+    assert not set(training_set['group']) & set(test_set['group'])
@@ -0,0 +1,36 @@
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.layers import Input, Concatenate, BatchNormalization, Activation, Conv1D
+from tensorflow.keras.models import Model
+from framework.model_manager.dense_net import CheckpointedConcatConv
+
+
+def get_models():
+    '''the checkpointed layer and the same BN-ReLU-Conv of the normal dense block, with the same weights'''
+    inputs = [Input((10, 3)), Input((10, 5))]
+    layer = CheckpointedConcatConv(4, 3)
+    checkpointed = Model(inputs, layer(inputs))
+
+    inputs = [Input((10, 3)), Input((10, 5))]
+    bn = BatchNormalization()
+    conv = Conv1D(4, 3, padding='same')
+    normal = Model(inputs, conv(Activation('relu')(bn(Concatenate()(inputs)))))
+    bn.set_weights(layer.batch_normalization.get_weights())
+    conv.set_weights(layer.conv.get_weights())
+    return checkpointed, layer.batch_normalization, normal, bn
+
+
+def test_moving_statistics_match_normal_dense_block():
+    random_state = np.random.RandomState(0)
+    x = [random_state.normal(1, 2, (8, 10, 3)).astype(np.float32), random_state.normal(-1, 1, (8, 10, 5)).astype(np.float32)]
+    y = random_state.normal(size=(8, 10, 4)).astype(np.float32)
+    checkpointed, checkpointed_bn, normal, normal_bn = get_models()
+    for model in (checkpointed, normal):
+        model.compile(tf.keras.optimizers.SGD(0.1), 'mse')
+        model.fit(x, y, batch_size=8, epochs=2, shuffle=False, verbose=0)
+
+    #the recomputed forward pass must not update the moving statistics a second time
+    assert np.allclose(checkpointed_bn.moving_mean.numpy(), normal_bn.moving_mean.numpy(), atol=1e-6)
+    assert np.allclose(checkpointed_bn.moving_variance.numpy(), normal_bn.moving_variance.numpy(), atol=1e-6)
+    assert np.allclose(checkpointed_bn.gamma.numpy(), normal_bn.gamma.numpy(), atol=1e-6)
+    assert np.allclose(checkpointed.predict(x, verbose=0), normal.predict(x, verbose=0), atol=1e-5)
@@ -0,0 +1,48 @@
+import os
+import numpy as np
+import pytest
+import tensorflow as tf
+from framework.model_manager import model_manager
+from framework.model_manager import model_manager_creator
+
+
+def get_model():
+    input_layer = tf.keras.layers.Input(shape=(None,))
+    x = tf.keras.layers.Embedding(22, 4)(input_layer)
+    x = tf.keras.layers.GlobalMaxPooling1D()(x)
+    return tf.keras.Model(inputs=input_layer, outputs=[tf.keras.layers.Dense(3, activation='sigmoid')(x)])
+
+
+def test_model_file_is_h5_without_export(tmp_path):
+    name = str(tmp_path / 'model')
+    get_model().save(name + '.h5')
+    assert model_manager_creator.instance.get_model_file(name) == name + '.h5'
+
+
+@pytest.mark.skipif(not model_manager.is_keras_3(), reason='keras 3 only')
+def test_keras_3_refuses_saved_model(tmp_path):
+    name = str(tmp_path / 'model')
+    model = get_model()
+    model.save(name + '.h5')
+    with pytest.raises(Exception, match='not supported by keras'):
+        model_manager.export_saved_model(model, name)
+    #an export written by tf.keras 2 is ignored, keras 3 can not load it
+    os.makedirs(model_manager.get_saved_model_path(name))
+    open(os.path.join(model_manager.get_saved_model_path(name), 'saved_model.pb'), 'wb').close()
+    assert model_manager_creator.instance.get_model_file(name) == name + '.h5'
+    os.remove(name + '.h5')
+    with pytest.raises(Exception, match='only has a TF SavedModel export'):
+        model_manager_creator.instance.get_model_file(name)
+
+
+@pytest.mark.skipif(model_manager.is_keras_3(), reason='tf.keras 2 only')
+def test_saved_model_is_preferred(tmp_path):
+    name = str(tmp_path / 'model')
+    model = get_model()
+    model.save(name + '.h5')
+    model_manager.export_saved_model(model, name)
+    model_file = model_manager_creator.instance.get_model_file(name)
+    assert model_file == model_manager.get_saved_model_path(name)
+    x = np.random.randint(1, 22, size=(2, 30))
+    loaded = tf.keras.models.load_model(model_file, compile=False)
+    assert np.allclose(np.asarray(loaded(x)), np.asarray(model(x)), atol=1e-5)
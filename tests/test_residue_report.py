@@ -0,0 +1,18 @@
+import pandas as pd
+from framework.data_manager.enzyme_protein_data_manager import enzyme_protein_data_manager
+from framework.tools import residue_report
+
+
+def test_report_only_covers_predicted_rows():
+    data_manager = enzyme_protein_data_manager({'max_len':10, 'ngram':1})
+    df = pd.DataFrame({'Entry name':['e1', 'e2', 'e3', 'e4'], 'Sequence':['ACD', 'A*C', 'A*' * 10, 'ACDEFGHIKL']})
+    df = data_manager.get_x_rows(df)
+    report = residue_report.unknown_residue_report()
+    report.add(df)
+    x, entry_name = data_manager.get_x(df)
+
+    #e3 and e4 are not shorter than max_len, so they are neither predicted nor reported
+    assert entry_name.tolist() == ['e1', 'e2']
+    assert x.shape == (2, 10)
+    assert report.seq_num == 2
+    assert report.records[0]['Entry name'].tolist() == ['e2']
@@ -0,0 +1,98 @@
+import warnings
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+from framework.model_manager import model_manager
+from framework.tools.sequence_sampling import BucketSequenceGenerator, SequenceGenerator
+
+
+def get_mixed_length_data(n=300, max_len=1000, seed=0):
+    '''most sequences fall in one bucket, so the first batches keras sees have the same width'''
+    random_state = np.random.RandomState(seed)
+    lengths = np.where(random_state.rand(n) < 0.9, random_state.randint(487, 729, n), random_state.randint(20, 486, n))
+    x = np.zeros((n, max_len), dtype=np.int32)
+    for i, length in enumerate(lengths):
+        x[i, :length] = random_state.randint(1, 21, length)
+    y = [(random_state.rand(n, 5) < 0.3).astype(np.float32)]
+    return x, y
+
+
+def get_length_agnostic_model():
+    input_layer = tf.keras.layers.Input(shape=(None,))
+    x = tf.keras.layers.Embedding(22, 8)(input_layer)
+    x = tf.keras.layers.Conv1D(8, 3, padding='same')(x)
+    x = tf.keras.layers.GlobalMaxPooling1D()(x)
+    output = tf.keras.layers.Dense(5, activation='sigmoid')(x)
+    model = tf.keras.Model(inputs=input_layer, outputs=[output])
+    model.compile(optimizer='adam', loss=['binary_crossentropy'])
+    return model
+
+
+class cluster_data_manager:
+    def __init__(self, n=100, cluster_num=13, seed=0):
+        random_state = np.random.RandomState(seed)
+        self.x = random_state.randint(1, 21, (n, 20))
+        self.y = [(random_state.rand(n, 5) < 0.3).astype(np.float32)]
+        self.training_set = pd.DataFrame({'Cluster name':['c%d' % (i % cluster_num) for i in range(n)]})
+
+    def get_training_data(self):
+        return self.x, self.y
+
+    def get_training_and_test_set(self):
+        return self.training_set, None
+
+    def get_task_num(self):
+        return 1
+
+
+def get_manager(model):
+    manager = model_manager.model_common_manager.__new__(model_manager.model_common_manager)
+    manager.config = {}
+    manager.context = {'model':model}
+    return manager
+
+
+def test_dataset_has_open_width():
+    x, y = get_mixed_length_data()
+    generator = BucketSequenceGenerator(x, y, 32)
+    widths = set(int(batch_x.shape[1]) for batch_x, _ in generator.to_dataset())
+    assert len(widths) > 1
+    assert widths <= set(generator.bucket_bounds.tolist())
+
+
+def test_fit_on_mixed_length_buckets():
+    x, y = get_mixed_length_data()
+    generator = BucketSequenceGenerator(x, y, 32)
+    manager = get_manager(get_length_agnostic_model())
+    manager.fit_generator(generator, epochs=2)
+    assert manager.get_model().predict(x[:4], verbose=0).shape == (4, 5)
+
+
+def test_untrimmed_batches_keep_width():
+    x, y = get_mixed_length_data(n=64)
+    generator = BucketSequenceGenerator(x, y, 32, trim=False)
+    dataset = generator.to_dataset()
+    assert all(int(batch_x.shape[1]) == x.shape[1] for batch_x, _ in dataset)
+
+
+def test_cluster_generator_takes_worker_settings():
+    generator = SequenceGenerator(cluster_data_manager(), 16, seed=0, workers=2, max_queue_size=4)
+    manager = get_manager(get_length_agnostic_model())
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        manager.fit_generator(generator, epochs=1, workers=2, max_queue_size=4)
+    assert not [e for e in caught if 'super().__init__' in str(e.message)]
+    if model_manager.is_keras_3():
+        assert generator.workers == 2
+        assert generator.max_queue_size == 4
+
+
+def test_parallel_dataset_keeps_batches():
+    x, y = get_mixed_length_data()
+    generator = BucketSequenceGenerator(x, y, 32, shuffle=False)
+    expected = [generator[i] for i in range(len(generator))]
+    batches = list(generator.to_dataset(workers=4))
+    assert len(batches) == len(expected)
+    for (batch_x, batch_y), (expected_x, expected_y) in zip(batches, expected):
+        assert np.array_equal(batch_x.numpy(), expected_x)
+        assert np.array_equal(batch_y[0].numpy(), expected_y[0])
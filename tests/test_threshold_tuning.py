@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from framework.tools import sparse_label
+from framework.tools import threshold_tuning
+
+
+def get_f_beta(pred, target, beta):
+    tp = np.count_nonzero(pred & target)
+    if tp == 0:
+        return 0.0
+    return (1 + beta * beta) * tp / (beta * beta * np.count_nonzero(target) + np.count_nonzero(pred))
+
+
+def get_best_f_beta(scores, target, beta):
+    '''brute force over every distinct score, and a threshold above all scores'''
+    candidates = np.concatenate([np.unique(scores) - 1e-6, [scores.max() + 1]])
+    return max(get_f_beta(scores > e, target, beta) for e in candidates)
+
+
+def get_data(seed, decimals):
+    random_state = np.random.RandomState(seed)
+    n, class_num = random_state.randint(1, 60), random_state.randint(1, 8)
+    scores = np.round(random_state.rand(n, class_num), decimals).astype(np.float32)
+    target = random_state.rand(n, class_num) < 0.3
+    return scores, target
+
+
+def to_sparse(target):
+    return sparse_label.sparse_label_set.from_label_lists([np.flatnonzero(e) for e in target], target.shape[1])
+
+
+@pytest.mark.parametrize('beta', [0.5, 1.0, 2.0])
+@pytest.mark.parametrize('sparse', [False, True])
+def test_class_thresholds_are_optimal(beta, sparse):
+    for seed in range(20):
+        scores, target = get_data(seed, 1 + seed % 3)
+        y = to_sparse(target) if sparse else target.astype(np.float32)
+        thresholds = threshold_tuning.get_class_thresholds(scores, y, beta, block_size=2 * len(scores))
+        for j in range(scores.shape[1]):
+            if not target[:, j].any():
+                assert thresholds[j] == 0.5
+                continue
+            best = get_best_f_beta(scores[:, j], target[:, j], beta)
+            assert np.isclose(get_f_beta(scores[:, j] > thresholds[j], target[:, j], beta), best)
+
+
+@pytest.mark.parametrize('beta', [0.5, 1.0, 2.0])
+@pytest.mark.parametrize('sparse', [False, True])
+def test_level_threshold_is_optimal(beta, sparse):
+    for seed in range(20):
+        scores, target = get_data(seed, 1 + seed % 3)
+        y = to_sparse(target) if sparse else target.astype(np.float32)
+        threshold = threshold_tuning.get_level_threshold(scores, y, beta, block_size=len(scores))
+        if not target.any():
+            assert threshold == 0.5
+            continue
+        assert np.isclose(get_f_beta(scores > threshold, target, beta), get_best_f_beta(scores, target, beta))
+
+
+def test_sparse_target_is_densified_by_columns():
+    scores, target = get_data(1, 2)
+    y = to_sparse(target)
+    assert np.array_equal(y.to_dense_columns(1, 3), target[:, 1:3].astype(np.float32))
+    assert np.array_equal(y.to_dense_columns(0, target.shape[1]), y.to_dense())